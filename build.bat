@@ -1,4 +1,7 @@
+python gui.py
+
 pyinstaller main.py ^
     --onefile ^
     --add-data="assets;assets" ^
+    --collect-submodules compiled_ui ^
     -w
\ No newline at end of file
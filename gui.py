@@ -1,12 +1,64 @@
+from functools import lru_cache
 from typing import Dict, List, Callable
+import importlib
+import os
 import traceback
 
-from PyQt5 import uic
+from PyQt5 import QtWidgets, uic
 from PyQt5.QtWidgets import *
 
 import utils
 
 
+# Package compile_ui_files writes precompiled .ui files to. Frozen builds ship
+# it so that no .ui file has to be parsed at startup.
+COMPILED_UI_PACKAGE = "compiled_ui"
+
+
+def get_compiled_module_name(gui_file_path: str) -> str:
+    """
+    Returns the name of the module given .ui file is compiled to
+    """
+    return os.path.splitext(os.path.basename(gui_file_path))[0].replace('-', '_')
+
+
+@lru_cache(maxsize=None)
+def load_form_class(gui_file_path: str) -> type:
+    """
+    Returns the form class built from given .ui file. Uses the precompiled
+    module if there is one, and compiles the .ui file otherwise.
+    """
+    try:
+        module = importlib.import_module(f"{COMPILED_UI_PACKAGE}.{get_compiled_module_name(gui_file_path)}")
+
+    except ImportError:
+        return uic.loadUiType(utils.get_path_in_bundle_dir(gui_file_path))[0]
+
+    return next(getattr(module, name) for name in dir(module) if name.startswith("Ui_"))
+
+
+def compile_ui_files(assets_dir: str = "assets") -> None:
+    """
+    Compiles every .ui file in given directory into a module of the
+    COMPILED_UI_PACKAGE, to be picked up by load_form_class
+    """
+    package_dir = utils.get_path_in_bundle_dir(COMPILED_UI_PACKAGE)
+
+    os.makedirs(package_dir, exist_ok=True)
+
+    open(os.path.join(package_dir, "__init__.py"), "w").close()
+
+    for file_name in sorted(os.listdir(utils.get_path_in_bundle_dir(assets_dir))):
+        if not file_name.endswith(".ui"):
+            continue
+
+        module_path = os.path.join(package_dir, get_compiled_module_name(file_name) + ".py")
+
+        with open(utils.get_path_in_bundle_dir(os.path.join(assets_dir, file_name)), encoding="utf-8") as ui_file, \
+                open(module_path, "w", encoding="utf-8") as module_file:
+            uic.compileUi(ui_file, module_file)
+
+
 class Gui(QMainWindow):
 
     def __init__(self, widget_type_id_dict: Dict[str, List[str]], gui_file_path: str, show_error: Callable = None, *args, **kwargs) -> None:
@@ -15,31 +67,22 @@ class Gui(QMainWindow):
         self.gui_file_path: str = utils.get_path_in_bundle_dir(gui_file_path)
         self.widget_type_id_dict: dict = utils.load_json(widget_type_id_dict)
 
-        uic.loadUi(self.gui_file_path, self)
+        load_form_class(gui_file_path)().setupUi(self)
 
-        # Stores all loaded widgets for easy access
-        self._widget_objects = self._load_widget_objects()
+        # Maps every widget id to its type, widgets themselves are looked up
+        # (and kept) the first time they are asked for
+        self._widget_types: Dict[str, type] = {
+            object_id: getattr(QtWidgets, object_type)
+            for object_type, id_list in self.widget_type_id_dict.items()
+            for object_id in id_list
+        }
+
+        self._widget_objects: Dict[str, QWidget] = {}
 
         self.show_error = show_error
 
         self.show()
 
-    def _load_widget_objects(self) -> Dict[str, QWidget]:
-        """
-        Returns a dictionary of QWidgets mapped by their ids
-        """
-        widget_objects: Dict[str, QWidget] = {}
-
-        for object_type, id_list in self.widget_type_id_dict.items():
-            for object_id in id_list:
-
-                # I use 'exec' here to avoid having to specify object type and
-                # instead only define it in ids.json
-                exec(
-                    "widget_objects[object_id] = self.findChild(" + object_type + ", object_id)")
-
-        return widget_objects
-
     def get_widget(self, widget_id) -> QWidget:
         """
         Returns a QWidget that matches the given id
@@ -47,9 +90,25 @@ class Gui(QMainWindow):
         try:
             return self._widget_objects[widget_id]
 
+        except KeyError:
+            pass
+
+        try:
+            widget = self.findChild(self._widget_types[widget_id], widget_id)
+
         except Exception as e:
             traceback.print_exc()
+            return None
+
+        self._widget_objects[widget_id] = widget
+
+        return widget
 
     def add_event_listener(self, widget_id: str, on_event: Callable) -> None:
 
-        self._widget_objects[widget_id].clicked.connect(on_event)
+        self.get_widget(widget_id).clicked.connect(on_event)
+
+
+if __name__ == '__main__':
+
+    compile_ui_files()
@@ -0,0 +1,221 @@
+from typing import Iterator, List, Optional, TextIO, Tuple
+
+import argparse
+import os
+import sys
+import time
+
+
+# NOTE
+#   Headless entry point for both ciphers, meant to be used as a shell filter:
+#
+#       python -m logic luigi-sacco encrypt --key TERAZİ --lang TR < message.txt
+#       python -m logic route decrypt --table-size 4x5 encrypted.txt -o message.txt
+#
+#   Input is read from the given file or stdin and output is written to the
+#   given file (which can't be the input file) or stdout. Cipher modules are
+#   only imported once the command is known (and PyQt5 never is), so starting
+#   up costs next to nothing.
+#
+#   Luigi Sacco with --block-size streams the input through block mode, so it
+#   never holds more than one block in memory. Every other command reads its
+#   whole input, since a single transposition needs all of it.
+
+# Characters read at a time when streaming
+READ_CHUNK_SIZE = 1 << 16
+
+
+def parse_table_size(value: str) -> Tuple[int, int]:
+    """
+    Parses a table size given as ROWSxCOLUMNS
+    """
+    try:
+        row_count, col_count = (int(part) for part in value.lower().split('x'))
+
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Table size must look like 4x5 (got '{value}')") from None
+
+    if row_count <= 0 or col_count <= 0:
+        raise argparse.ArgumentTypeError(f"Table size must be positive (got '{value}')")
+
+    return row_count, col_count
+
+
+def iter_chunks(source: TextIO) -> Iterator[str]:
+    """
+    Yields given file READ_CHUNK_SIZE characters at a time
+    """
+    while True:
+        chunk = source.read(READ_CHUNK_SIZE)
+
+        if not chunk:
+            return
+
+        yield chunk
+
+
+def read_message(source: TextIO) -> str:
+    """
+    Reads all of given file, without the line break a shell usually ends input
+    with
+    """
+    message = source.read()
+
+    if message.endswith('\r\n'):
+        return message[:-2]
+
+    if message.endswith('\n'):
+        return message[:-1]
+
+    return message
+
+
+def run_luigi_sacco(args: argparse.Namespace, source: TextIO, destination: TextIO) -> int:
+    """
+    Runs a Luigi Sacco command and returns the number of characters it read
+    """
+    if args.block_size is not None:
+        from .block_mode import decrypt_stream, encrypt_stream
+
+        transpose_stream = encrypt_stream if args.action == "encrypt" else decrypt_stream
+
+        read_length = 0
+
+        def counted_chunks() -> Iterator[str]:
+            nonlocal read_length
+
+            for chunk in iter_chunks(source):
+                read_length += len(chunk)
+                yield chunk
+
+        for block in transpose_stream(args.key, counted_chunks(), args.lang, args.block_size):
+            destination.write(block)
+
+        destination.write('\n')
+
+        return read_length
+
+    from .luigi_sacco import luigi_sacco_decrypt, luigi_sacco_encrypt
+
+    message = read_message(source)
+
+    if args.action == "encrypt":
+        output = luigi_sacco_encrypt(args.key, message, args.lang, with_spaces=args.with_spaces)
+    else:
+        output = luigi_sacco_decrypt(args.key, message, args.lang)
+
+    destination.write(output + '\n')
+
+    return len(message)
+
+
+def run_route(args: argparse.Namespace, source: TextIO, destination: TextIO) -> int:
+    """
+    Runs a route encryption command and returns the number of characters it
+    read
+    """
+    from .route_encryption import get_potential_table_sizes, route_decrypt, route_encrypt
+
+    message = read_message(source)
+
+    if not message:
+        raise ValueError("Input is empty, there is nothing to put in a table")
+
+    if args.table_size is not None:
+        table_size = args.table_size
+    else:
+        _, table_size = get_potential_table_sizes(len(message))
+
+    if args.stats:
+        print(f"Table size: {table_size[0]}x{table_size[1]}", file=sys.stderr)
+
+    if args.action == "encrypt":
+        output = route_encrypt(message, table_size)
+    else:
+        output = route_decrypt(message, table_size)
+
+    destination.write(output + '\n')
+
+    return len(message)
+
+
+def get_parser() -> argparse.ArgumentParser:
+
+    parser = argparse.ArgumentParser(
+        prog="python -m logic",
+        description="Encrypts / decrypts text with Luigi Sacco or E4 & B3 route encryption, without the GUI"
+    )
+
+    commands = parser.add_subparsers(dest="cipher", required=True)
+
+    luigi_sacco_parser = commands.add_parser("luigi-sacco", help="Luigi Sacco columnar transposition")
+    luigi_sacco_parser.add_argument("--key", required=True, help="encryption key")
+    luigi_sacco_parser.add_argument("--lang", default="TR", help="language code of key and text (default: TR)")
+    luigi_sacco_parser.add_argument("--with-spaces", action="store_true", help="put a space between encrypted words")
+    luigi_sacco_parser.add_argument("--block-size", type=int, help="stream the input through block mode with blocks of this many letters")
+    luigi_sacco_parser.set_defaults(run=run_luigi_sacco)
+
+    route_parser = commands.add_parser("route", help="E4 & B3 route encryption")
+    route_parser.add_argument("--table-size", type=parse_table_size, help="table size as ROWSxCOLUMNS (default: optimal size for the input)")
+    route_parser.set_defaults(run=run_route)
+
+    for command_parser in (luigi_sacco_parser, route_parser):
+        command_parser.add_argument("action", choices=["encrypt", "decrypt"])
+        command_parser.add_argument("input", nargs="?", help="file to read (default: stdin)")
+        command_parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+        command_parser.add_argument("--stats", action="store_true", help="print a timing summary to stderr")
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+
+    args = get_parser().parse_args(argv)
+
+    start = time.perf_counter()
+
+    sink = None
+
+    if args.stats:
+        from . import tracing
+
+        sink = tracing.CollectingSink()
+        tracing.add_sink(sink)
+
+    # Opening the output truncates it, which would wipe the input before it is read
+    if args.input and args.output and os.path.exists(args.output) and os.path.samefile(args.input, args.output):
+        print("error: Output file is the input file, write to another file instead", file=sys.stderr)
+        return 1
+
+    source = open(args.input, encoding="utf-8") if args.input else sys.stdin
+    destination = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    try:
+        read_length = args.run(args, source, destination)
+
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+
+    finally:
+        if args.input:
+            source.close()
+
+        if args.output:
+            destination.close()
+
+    if sink is not None:
+        elapsed = time.perf_counter() - start
+
+        for name, seconds in sink.get_totals().items():
+            print(f"{name:>14} {seconds * 1000:>10.3f} ms", file=sys.stderr)
+
+        print(f"{'total':>14} {elapsed * 1000:>10.3f} ms, {read_length} chars, "
+              f"{read_length / elapsed if elapsed > 0 else 0:.0f} chars/s", file=sys.stderr)
+
+    return 0
+
+
+if __name__ == '__main__':
+
+    sys.exit(main())
@@ -0,0 +1,155 @@
+from typing import Callable, Dict, List, Optional, Pattern, TypeVar
+
+import re
+import string
+
+from .common import TURKISH_ALPHABET, ENGLISH_ALPHABET
+
+
+# NOTE
+#   Every language the ciphers support is an Alphabet in a registry, so new
+#   ones can be added without touching cipher code:
+#
+#       register_alphabet("XX", "ABCDEFGHIJKLMNOPQRSTUVWXYZ", file_encoding="ascii")
+#
+#   special_lower_case_letters overrides str.lower() where a language disagrees
+#   with it (such as I -> ı in Turkish), and file_encoding is the single byte
+#   encoding file mode stores the language in.
+
+# Letters that don't belong to an alphabet are translated to this rank, which
+# is bigger than any registered alphabet is allowed to be
+INVALID_RANK = chr(0xFF)
+
+
+class RankTable(dict):
+    """
+    Translation table mapping every letter of an alphabet to a character whose
+    code point is that letter's rank. Anything else maps to INVALID_RANK, so a
+    single str.translate call ranks (and checks) a whole text.
+    """
+
+    def __missing__(self, code_point: int) -> str:
+        return INVALID_RANK
+
+
+class Alphabet:
+    """
+    Everything the ciphers need to know about one language, built once when the
+    alphabet is registered:
+
+        - indices:                    letter -> position in the alphabet
+        - rank_table:                 str.translate table, letter -> chr(position)
+        - decode_table:               str.translate table, chr(position) -> letter
+        - normalization_table:        str.translate table upper casing letters and removing white space
+        - invalid_character_pattern:  regex matching anything that is not a letter
+        - file_encoding:              single byte encoding for file mode, if there is one
+    """
+
+    def __init__(self, code: str, letters: str, special_lower_case_letters: Optional[Dict[str, str]] = None,
+                 file_encoding: Optional[str] = None) -> None:
+
+        if len(set(letters)) != len(letters):
+            raise ValueError(f"Alphabet '{code}' has repeating letters")
+
+        if len(letters) >= ord(INVALID_RANK):
+            raise ValueError(f"Alphabet '{code}' has too many letters ({len(letters)})")
+
+        self.code = code
+        self.letters = letters
+        self.file_encoding = file_encoding
+
+        self.indices: Dict[str, int] = {letter: letter_index for letter_index, letter in enumerate(letters)}
+
+        self.rank_table = RankTable({ord(letter): chr(rank) for letter, rank in self.indices.items()})
+
+        self.decode_table: Dict[int, str] = {
+            byte: letters[byte] if byte < len(letters) else INVALID_RANK for byte in range(256)
+        }
+
+        # Lower case versions of letters that str.lower() gets wrong for this language
+        special_lower_case_letters = special_lower_case_letters or {}
+
+        self.normalization_table: Dict[int, Optional[str]] = {ord(char): None for char in string.whitespace}
+
+        for letter in letters:
+            lower_case_letter = special_lower_case_letters.get(letter, letter.lower())
+
+            # Some letters (like 'ß') don't lower case into a single character
+            if len(lower_case_letter) == 1:
+                self.normalization_table[ord(lower_case_letter)] = letter
+
+            self.normalization_table[ord(letter)] = letter
+
+        self.invalid_character_pattern: Pattern = re.compile(f"[^{re.escape(letters)}]")
+
+    def __repr__(self) -> str:
+        return f"Alphabet({self.code!r}, {self.letters!r})"
+
+
+ALPHABETS: Dict[str, Alphabet] = {}
+
+# lru_cache'd functions whose results depend on registered alphabets
+ALPHABET_CACHES: List[Callable] = []
+
+CachedFunction = TypeVar("CachedFunction", bound=Callable)
+
+
+def register_alphabet_cache(cached_function: CachedFunction) -> CachedFunction:
+    """
+    Marks given lru_cache'd function as depending on registered alphabets, so
+    that it is cleared whenever an alphabet is registered again. Can be used as
+    a decorator.
+    """
+    ALPHABET_CACHES.append(cached_function)
+
+    return cached_function
+
+
+def register_alphabet(code: str, letters: str, special_lower_case_letters: Optional[Dict[str, str]] = None,
+                      file_encoding: Optional[str] = None) -> Alphabet:
+    """
+    Registers a new alphabet under given language code, after which it can be
+    used as the 'lang' of every cipher function. Letters must be given in
+    upper case and in alphabetical order.
+
+    Registering an alphabet again replaces it, and clears every cache
+    registered with register_alphabet_cache.
+    """
+    alphabet = Alphabet(code, letters, special_lower_case_letters, file_encoding)
+
+    replaced = code in ALPHABETS
+
+    ALPHABETS[code] = alphabet
+
+    if replaced:
+        for cached_function in ALPHABET_CACHES:
+            cached_function.cache_clear()
+
+    return alphabet
+
+
+def get_alphabet(lang: str) -> Alphabet:
+    """
+    Returns the registered alphabet of given language
+    """
+    try:
+        return ALPHABETS[lang]
+
+    except KeyError:
+        raise ValueError(f"Unsupported Language ({lang})") from None
+
+
+def get_supported_languages() -> List[str]:
+    """
+    Returns codes of all registered alphabets
+    """
+    return list(ALPHABETS)
+
+
+register_alphabet("TR", ''.join(TURKISH_ALPHABET), {"I": "ı", "İ": "i"}, file_encoding="iso-8859-9")
+
+register_alphabet("EN", ''.join(ENGLISH_ALPHABET), file_encoding="ascii")
+
+register_alphabet("DE", "AÄBCDEFGHIJKLMNOÖPQRSßTUÜVWXYZ", file_encoding="iso-8859-1")
+
+register_alphabet("AZ", "ABCÇDEƏFGĞHXIİJKQLMNOÖPRSŞTUÜVYZ", {"I": "ı", "İ": "i"})
@@ -0,0 +1,240 @@
+from concurrent.futures import Executor
+from typing import AsyncIterable, AsyncIterator, Callable, List, Optional, Tuple
+
+import asyncio
+import codecs
+import functools
+
+from .block_mode import DEFAULT_BLOCK_SIZE, transpose_block
+from .normalization import normalize_text
+from .route_encryption import get_potential_table_sizes, route_decrypt, route_encrypt
+
+
+# NOTE
+#   Async versions of block mode for asyncio pipelines:
+#
+#       async for block in aencrypt_stream(reader, key, lang="EN"):
+#           ...
+#
+#   Input is read from an asyncio.StreamReader (or anything with an async
+#   read(n) returning bytes or str) READ_SIZE at a time. Bytes are decoded
+#   incrementally, so multi-byte characters may be split across reads.
+#
+#   Nothing is read ahead: the next chunk is only read once the consumer asks
+#   for the next block, so a slow consumer slows down reading and memory stays
+#   bounded by one block and one chunk. Blocks of at least offload_threshold
+#   characters are transposed in an executor (the loop's default thread pool
+#   unless one is given, pass a ProcessPoolExecutor for CPU parallelism), so
+#   the event loop never stalls on a big block.
+#
+#   Luigi Sacco streams give the same output as encrypt_stream in
+#   logic/block_mode.py. Route streams split the raw text into blocks filling
+#   a table of given size, and transpose the last (shorter) block with the
+#   optimal table size for its length. Decrypting with the same table size
+#   sees the same block lengths, so both round-trip exactly.
+
+READ_SIZE = 1 << 16
+
+# Blocks at least this long are transposed in an executor
+DEFAULT_OFFLOAD_THRESHOLD = 1 << 16
+
+
+async def aiter_chunks(reader, encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Yields text read from given reader READ_SIZE at a time until it is
+    exhausted
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+
+    while True:
+        data = await reader.read(READ_SIZE)
+
+        if not data:
+            break
+
+        text = decoder.decode(data) if isinstance(data, (bytes, bytearray)) else data
+
+        if text:
+            yield text
+
+    tail = decoder.decode(b"", final=True)
+
+    if tail:
+        yield tail
+
+
+async def aiter_blocks(chunks: AsyncIterable[str], block_size: int) -> AsyncIterator[str]:
+    """
+    Regroups given chunks of text into blocks of exactly block_size characters,
+    like iter_blocks in logic/block_mode.py
+    """
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive (got {block_size})")
+
+    pending: List[str] = []
+    pending_length = 0
+
+    async for chunk in chunks:
+        while chunk:
+            needed = block_size - pending_length
+
+            pending.append(chunk[:needed])
+            pending_length += len(pending[-1])
+            chunk = chunk[needed:]
+
+            if pending_length == block_size:
+                yield ''.join(pending)
+
+                pending = []
+                pending_length = 0
+
+    if pending_length > 0:
+        yield ''.join(pending)
+
+
+async def _run(function: Callable[..., str], *args, block_length: int, executor: Optional[Executor],
+               offload_threshold: int) -> str:
+    """
+    Runs given function right away for small blocks, and in the executor for
+    big ones
+    """
+    if block_length < offload_threshold:
+        return function(*args)
+
+    return await asyncio.get_event_loop().run_in_executor(executor, functools.partial(function, *args))
+
+
+async def _aiter_normalized_chunks(chunks: AsyncIterable[str], lang: str) -> AsyncIterator[str]:
+    async for chunk in chunks:
+        yield normalize_text(chunk, lang)
+
+
+async def _atranspose_stream(reader, key: str, lang: str, block_size: int, reverse: bool, executor: Optional[Executor],
+                             offload_threshold: int, encoding: str) -> AsyncIterator[str]:
+    key = normalize_text(key, lang, "key")
+
+    async for block in aiter_blocks(_aiter_normalized_chunks(aiter_chunks(reader, encoding), lang), block_size):
+        yield await _run(transpose_block, key, block, lang, reverse,
+                         block_length=len(block), executor=executor, offload_threshold=offload_threshold)
+
+
+def aencrypt_stream(reader, key: str, lang: str = "TR", block_size: int = DEFAULT_BLOCK_SIZE, executor: Optional[Executor] = None,
+                    offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD, encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Encrypts everything read from given reader with Luigi Sacco in block mode,
+    yielding one encrypted block at a time
+    """
+    return _atranspose_stream(reader, key, lang, block_size, False, executor, offload_threshold, encoding)
+
+
+def adecrypt_stream(reader, key: str, lang: str = "TR", block_size: int = DEFAULT_BLOCK_SIZE, executor: Optional[Executor] = None,
+                    offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD, encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Decrypts everything read from given reader with Luigi Sacco in block mode,
+    yielding one decrypted block at a time. block_size has to be the one the
+    stream was encrypted with.
+    """
+    return _atranspose_stream(reader, key, lang, block_size, True, executor, offload_threshold, encoding)
+
+
+async def _aroute_stream(reader, table_size: Tuple[int, int], reverse: bool, executor: Optional[Executor],
+                         offload_threshold: int, encoding: str) -> AsyncIterator[str]:
+    table_size = tuple(table_size)
+    cipher_function = route_decrypt if reverse else route_encrypt
+
+    async for block in aiter_blocks(aiter_chunks(reader, encoding), table_size[0] * table_size[1]):
+        if len(block) == table_size[0] * table_size[1]:
+            block_table_size = table_size
+        else:
+            _, block_table_size = get_potential_table_sizes(len(block))
+
+        yield await _run(cipher_function, block, block_table_size,
+                         block_length=len(block), executor=executor, offload_threshold=offload_threshold)
+
+
+def aroute_encrypt_stream(reader, table_size: Tuple[int, int], executor: Optional[Executor] = None,
+                          offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD, encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Encrypts everything read from given reader with E4 & B3 routes, one table
+    of given size at a time, yielding one encrypted block at a time
+    """
+    return _aroute_stream(reader, table_size, False, executor, offload_threshold, encoding)
+
+
+def aroute_decrypt_stream(reader, table_size: Tuple[int, int], executor: Optional[Executor] = None,
+                          offload_threshold: int = DEFAULT_OFFLOAD_THRESHOLD, encoding: str = "utf-8") -> AsyncIterator[str]:
+    """
+    Decrypts everything read from given reader with E4 & B3 routes. table_size
+    has to be the one the stream was encrypted with.
+    """
+    return _aroute_stream(reader, table_size, True, executor, offload_threshold, encoding)
+
+
+async def apipe(blocks: AsyncIterable[str], writer: asyncio.StreamWriter, encoding: str = "utf-8") -> int:
+    """
+    Writes every block to given writer, waiting for it to drain after each
+    one, and returns the number of characters written
+    """
+    written = 0
+
+    async for block in blocks:
+        writer.write(block.encode(encoding))
+        written += len(block)
+
+        await writer.drain()
+
+    return written
+
+
+def execute_tests() -> None:
+    """
+    Round-trips both ciphers through in-memory streams, with and without
+    offloading, and checks Luigi Sacco matches block mode
+    """
+    from .block_mode import encrypt_stream
+
+    message = "Ünlü bir şiir çok güzel bir dizeyle başlar " * 300
+
+    async def collect(blocks: AsyncIterable[str]) -> str:
+        return ''.join([block async for block in blocks])
+
+    def get_reader(text: str) -> asyncio.StreamReader:
+        reader = asyncio.StreamReader()
+        reader.feed_data(text.encode("utf-8"))
+        reader.feed_eof()
+        return reader
+
+    async def run_tests() -> Tuple[int, int]:
+        total, total_correct = 0, 0
+
+        for block_size in [1, 7, 1000, 100000]:
+            for offload_threshold in [0, DEFAULT_OFFLOAD_THRESHOLD]:
+                encrypted = await collect(aencrypt_stream(get_reader(message), "TERAZİ", "TR", block_size,
+                                                          offload_threshold=offload_threshold))
+                decrypted = await collect(adecrypt_stream(get_reader(encrypted), "TERAZİ", "TR", block_size,
+                                                          offload_threshold=offload_threshold))
+
+                total += 1
+
+                if decrypted == normalize_text(message, "TR") and encrypted == ''.join(encrypt_stream("TERAZİ", [message], "TR", block_size)):
+                    total_correct += 1
+
+        for table_size in [(1, 1), (3, 4), (50, 60)]:
+            encrypted = await collect(aroute_encrypt_stream(get_reader(message), table_size, offload_threshold=0))
+            decrypted = await collect(aroute_decrypt_stream(get_reader(encrypted), table_size))
+
+            total += 1
+
+            if decrypted == message:
+                total_correct += 1
+
+        return total, total_correct
+
+    total, total_correct = asyncio.run(run_tests())
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+
+if __name__ == '__main__':
+
+    execute_tests()
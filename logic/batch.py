@@ -0,0 +1,312 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import argparse
+import json
+import os
+import sys
+import time
+
+from .luigi_sacco import luigi_sacco_encrypt, luigi_sacco_decrypt
+from .route_encryption import route_encrypt, route_decrypt, get_potential_table_sizes
+
+
+# NOTE
+#   Jobs are read from a JSONL file, one job per line:
+#
+#       {"cipher": "luigi_sacco", "action": "encrypt", "key": "...", "lang": "EN", "text": "..."}
+#       {"cipher": "route", "action": "decrypt", "table_size": [4, 5], "text": "..."}
+#
+#   'lang' defaults to TR, and 'table_size' defaults to the optimal size for
+#   the length of the text.
+#
+#   Results are written as JSONL in the same order as the jobs, either as
+#   {"result": "..."} or {"error": "..."} if the job failed. Lines that aren't
+#   a JSON object get an error result of their own instead of stopping the run.
+#
+#   Jobs are read and sent to the workers one chunk at a time, and at most
+#   MAX_PENDING_CHUNKS_PER_WORKER chunks per worker are in flight at once.
+#   Results are written as soon as their chunk (and every chunk before it) is
+#   done, so memory use depends on the chunk size and the number of workers,
+#   not on the number of jobs.
+#
+#   Jobs of a chunk that share a key (or table size) are sorted next to each
+#   other, so a worker runs the same key over and over and gets to reuse its
+#   cached key schedule and plans.
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# Chunks sent to the pool ahead of the one whose results are awaited, per worker
+MAX_PENDING_CHUNKS_PER_WORKER = 2
+
+
+def parse_job(line: str, line_number: int) -> Dict[str, Any]:
+    """
+    Returns the job on given line of a jobs file. A line that isn't a JSON
+    object is returned as an invalid job, which fails when it is run.
+    """
+    try:
+        job = json.loads(line)
+
+    except ValueError as e:
+        return {"invalid": f"Line {line_number} is not valid JSON ({e})"}
+
+    if not isinstance(job, dict):
+        return {"invalid": f"Line {line_number} is not a JSON object"}
+
+    return job
+
+
+def run_job(job: Dict[str, Any]) -> str:
+    """
+    Runs a single job and returns its output text
+    """
+    if "invalid" in job:
+        raise ValueError(job["invalid"])
+
+    cipher, action = job.get("cipher"), job.get("action")
+
+    if action not in ["encrypt", "decrypt"]:
+        raise ValueError(f"Unsupported Action ({action})")
+
+    if cipher == "luigi_sacco":
+        cipher_function = luigi_sacco_encrypt if action == "encrypt" else luigi_sacco_decrypt
+
+        return cipher_function(job["key"], job["text"], job.get("lang", "TR"))
+
+    elif cipher == "route":
+        cipher_function = route_encrypt if action == "encrypt" else route_decrypt
+
+        if job.get("table_size") is not None:
+            table_size = tuple(job["table_size"])
+
+        else:
+            _, table_size = get_potential_table_sizes(len(job["text"]))
+
+        return cipher_function(job["text"], table_size)
+
+    else:
+        raise ValueError(f"Unsupported Cipher ({cipher})")
+
+
+def run_jobs(jobs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """
+    Runs given chunk of jobs and returns their results in the same order.
+    Failing jobs produce an error instead of stopping the whole chunk.
+    """
+    results = []
+
+    for job in jobs:
+        try:
+            results.append({"result": run_job(job)})
+
+        except Exception as e:
+            results.append({"error": f"{type(e).__name__}: {e}"})
+
+    return results
+
+
+def get_group_key(job: Dict[str, Any]) -> Tuple[str, str, str]:
+    """
+    Returns the key jobs are grouped by, so jobs using the same key schedule or
+    route plan end up in the same chunks
+    """
+    return (
+        str(job.get("cipher")),
+        str(job.get("key", job.get("table_size"))),
+        str(job.get("lang", "TR"))
+    )
+
+
+def _submit_chunk(executor: ProcessPoolExecutor, chunk: List[Dict[str, Any]]) -> Tuple[List[int], Future]:
+    """
+    Sends given chunk to the pool with jobs sharing a key next to each other,
+    and returns the order they were sent in along with the future of their
+    results
+    """
+    order = sorted(range(len(chunk)), key=lambda i: get_group_key(chunk[i]))
+
+    return order, executor.submit(run_jobs, [chunk[i] for i in order])
+
+
+def _collect_chunk(order: List[int], future: Future) -> List[Dict[str, str]]:
+    """
+    Waits for the results of a chunk and puts them back in the order of its jobs
+    """
+    results: List[Dict[str, str]] = [{} for _ in order]
+
+    for job_index, result in zip(order, future.result()):
+        results[job_index] = result
+
+    return results
+
+
+def iter_batch(jobs: Iterable[Dict[str, Any]], workers: Optional[int] = None,
+               chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, str]]:
+    """
+    Spreads given jobs across a pool of worker processes and yields their
+    results in the same order as the jobs. Jobs are only read a few chunks
+    ahead of the results yielded so far.
+    """
+    if chunk_size <= 0:
+        raise ValueError(f"Chunk size must be positive (got {chunk_size})")
+
+    workers = workers or os.cpu_count() or 1
+
+    jobs = iter(jobs)
+
+    pending: Deque[Tuple[List[int], Future]] = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            while len(pending) < workers * MAX_PENDING_CHUNKS_PER_WORKER:
+                chunk = list(islice(jobs, chunk_size))
+
+                if not chunk:
+                    break
+
+                pending.append(_submit_chunk(executor, chunk))
+
+            if not pending:
+                return
+
+            yield from _collect_chunk(*pending.popleft())
+
+
+def run_batch(jobs: Iterable[Dict[str, Any]], workers: Optional[int] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> List[Dict[str, str]]:
+    """
+    Spreads given jobs across a pool of worker processes and returns their
+    results in the same order as the jobs. Use iter_batch to not hold all of
+    them in memory.
+    """
+    return list(iter_batch(jobs, workers, chunk_size))
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+
+    parser = argparse.ArgumentParser(
+        prog="python -m logic.batch",
+        description="Runs Luigi Sacco and Route Encryption jobs from a JSONL file across multiple processes"
+    )
+
+    parser.add_argument("jobs", help="JSONL file with one job per line")
+    parser.add_argument("results", help="JSONL file to write results to, in the same order as the jobs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="number of jobs sent to a worker at once")
+
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+
+    job_count = 0
+    failed_jobs = 0
+    total_characters = 0
+
+    def read_jobs(jobs_file) -> Iterator[Dict[str, Any]]:
+        nonlocal job_count, total_characters
+
+        for line_number, line in enumerate(jobs_file, 1):
+            if not line.strip():
+                continue
+
+            job = parse_job(line, line_number)
+
+            job_count += 1
+
+            if isinstance(job.get("text"), str):
+                total_characters += len(job["text"])
+
+            yield job
+
+    with open(args.jobs, encoding="utf-8") as jobs_file, open(args.results, "w", encoding="utf-8") as results_file:
+        for result in iter_batch(read_jobs(jobs_file), workers=args.workers, chunk_size=args.chunk_size):
+            results_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+            failed_jobs += "error" in result
+
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"Ran {job_count} jobs ({failed_jobs} failed) in {elapsed:.3f}s: "
+        f"{job_count / elapsed:.1f} jobs/s, {total_characters / elapsed:.1f} chars/s",
+        file=sys.stderr
+    )
+
+
+def execute_tests() -> None:
+    """
+    Runs a jobs file with mixed keys, ciphers and bad lines through main, and
+    checks every result is where its job was, whatever the chunking
+    """
+    import tempfile
+
+    lines = []
+
+    for i in range(50):
+        key = ["TERAZİ", "ANAHTAR", "KISA"][i % 3]
+
+        lines.append(json.dumps({"cipher": "luigi_sacco", "action": "encrypt", "key": key, "lang": "TR", "text": f"Mesaj {'a' * i}"}, ensure_ascii=False))
+        lines.append(json.dumps({"cipher": "route", "action": "encrypt", "table_size": [2, 3], "text": f"ABCDE{i % 10}"}))
+
+    lines[7] = '{"cipher": "route", "action": '
+    lines[20] = '["not", "a", "job"]'
+    lines[33] = json.dumps({"cipher": "caesar", "action": "encrypt", "text": "ABC"})
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    # Jobs sharing a key end up next to each other in a chunk
+    total += 1
+
+    group_keys = [get_group_key(job) for job in [parse_job(line, 1) for line in lines[:12]] if "invalid" not in job]
+
+    if len(set(group_keys)) == 4:
+        total_correct += 1
+
+    else:
+        faulty_tests.append(("group keys", group_keys))
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs_path = os.path.join(directory, "jobs.jsonl")
+        results_path = os.path.join(directory, "results.jsonl")
+
+        with open(jobs_path, "w", encoding="utf-8") as _file:
+            _file.write("\n".join(lines[:10]) + "\n\n" + "\n".join(lines[10:]) + "\n")
+
+        expected = run_jobs([parse_job(line, 1) for line in lines])
+
+        for chunk_size in [1, 7, 1000]:
+            main([jobs_path, results_path, "--workers", "2", "--chunk-size", str(chunk_size)])
+
+            with open(results_path, encoding="utf-8") as _file:
+                results = [json.loads(line) for line in _file]
+
+            checks = [
+                len(results) == len(lines),
+                [list(result) for result in results] == [list(result) for result in expected],
+                [result.get("result") for result in results] == [result.get("result") for result in expected],
+                [i for i, result in enumerate(results) if "error" in result] == [7, 20, 33],
+                "Line 8 is not valid JSON" in results[7]["error"],
+                "Line 22 is not a JSON object" in results[20]["error"],
+            ]
+
+            total += len(checks)
+            total_correct += sum(checks)
+
+            if not all(checks):
+                faulty_tests.append(("chunk size", chunk_size, checks))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    main()
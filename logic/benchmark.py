@@ -0,0 +1,336 @@
+from typing import Any, Callable, Dict, List, Optional
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+from .alphabets import get_alphabet
+from .cryptanalysis import get_sample_corpus
+from .key_schedule import order_key
+from . import luigi_sacco, route_encryption
+from .luigi_sacco import luigi_sacco_encrypt, luigi_sacco_decrypt
+from .route_encryption import get_potential_table_sizes, route_encrypt, route_decrypt
+
+
+# NOTE
+#   Every cipher path is timed on inputs from MIN_SIZE up to a maximum size,
+#   at 1 and 3 times every power of ten. Inputs come from a deterministic corpus
+#   generator, so two runs (or two machines) time exactly the same texts.
+#
+#   Caches are cleared before every timed call, so the numbers are for cold
+#   calls. The empirical complexity exponent of a path is the slope of a least
+#   squares fit of log(seconds) against log(size), over the sizes big enough
+#   that per call overhead does not dominate. Inputs up to the
+#   PLAN_CACHE_MAX_LENGTH of either cipher compile a plan (which is slower per
+#   character) and longer ones don't, so only sizes well past that threshold
+#   are fitted, or the exponent mixes both paths. Paths in LINEAR_PATHS are
+#   expected to fit close to 1.
+#
+#   Results are written as JSON:
+#
+#       {"python": "...", "results": {"route_encrypt": {"sizes": [...], "seconds": [...], "exponent": 1.02}, ...}}
+#
+#   and can be compared against a stored baseline, in which case every path
+#   that got slower by more than the tolerance is reported as a regression.
+
+MIN_SIZE = 10
+
+DEFAULT_MAX_SIZE = 10**6
+
+# Sizes below this are left out when fitting the complexity exponent
+MIN_FIT_SIZE = 10 * max(luigi_sacco.PLAN_CACHE_MAX_LENGTH, route_encryption.PLAN_CACHE_MAX_LENGTH)
+
+# Baseline timings shorter than this are too noisy to flag regressions on
+MIN_COMPARED_SECONDS = 0.001
+
+DEFAULT_TOLERANCE = 0.25
+
+# Exponent increase that counts as a regression, whatever the timings say
+EXPONENT_TOLERANCE = 0.15
+
+# Paths that are O(n), and how far their exponent may be from 1
+LINEAR_PATHS = ["luigi_sacco_encrypt", "luigi_sacco_decrypt", "route_encrypt", "route_decrypt"]
+LINEAR_EXPONENT_TOLERANCE = 0.2
+
+# Length of the block of words the corpus generator repeats for longer texts
+CORPUS_BLOCK_SIZE = 2**16
+
+KEYS = {
+    "EN": "THISISAVERYLONGKEYINDEED",
+    "TR": "ÇOKUZUNBİRANAHTARKELİMESİ",
+}
+
+
+def generate_corpus(length: int, lang: str = "EN", seed: int = 0) -> str:
+    """
+    Returns a normalized (upper case, letters only) text of given length, made
+    of words of the sample corpus of given language picked in a random order
+    that only depends on the seed
+    """
+    alphabet = get_alphabet(lang)
+
+    words = [alphabet.invalid_character_pattern.sub('', word.translate(alphabet.normalization_table))
+             for word in get_sample_corpus(lang).split()]
+    words = [word for word in words if word]
+
+    rng = random.Random(seed)
+
+    block: List[str] = []
+    block_length = 0
+
+    while block_length < min(length, CORPUS_BLOCK_SIZE):
+        word = rng.choice(words)
+        block.append(word)
+        block_length += len(word)
+
+    text = ''.join(block)
+
+    return (text * (length // len(text) + 1))[:length]
+
+
+def _time_call(function: Callable[[], Any], repeat: int, clear_caches: Callable[[], None]) -> float:
+    """
+    Returns the best time out of given number of cold calls to function
+    """
+    best = math.inf
+
+    for _ in range(repeat):
+        clear_caches()
+
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def _clear_caches() -> None:
+    luigi_sacco.clear_plan_cache()
+    route_encryption.clear_plan_cache()
+    route_encryption.clear_table_size_cache()
+
+
+def get_benchmark_cases(lang: str) -> Dict[str, Callable[[int], Callable[[], Any]]]:
+    """
+    Returns every benchmarked path mapped to a function which prepares the
+    input of given size and returns the call to time
+    """
+    key = KEYS[lang]
+
+    def prepare_luigi_sacco_encrypt(size: int) -> Callable[[], Any]:
+        message = generate_corpus(size, lang)
+        return lambda: luigi_sacco_encrypt(key, message, lang=lang, normalized=True)
+
+    def prepare_luigi_sacco_decrypt(size: int) -> Callable[[], Any]:
+        encrypted_message = luigi_sacco_encrypt(key, generate_corpus(size, lang), lang=lang, normalized=True)
+        return lambda: luigi_sacco_decrypt(key, encrypted_message, lang=lang, normalized=True)
+
+    def prepare_route_encrypt(size: int) -> Callable[[], Any]:
+        message = generate_corpus(size, lang)
+        _, table_size = get_potential_table_sizes(size)
+        return lambda: route_encrypt(message, table_size)
+
+    def prepare_route_decrypt(size: int) -> Callable[[], Any]:
+        _, table_size = get_potential_table_sizes(size)
+        encrypted_message = route_encrypt(generate_corpus(size, lang), table_size)
+        return lambda: route_decrypt(encrypted_message, table_size)
+
+    def prepare_order_key(size: int) -> Callable[[], Any]:
+        long_key = generate_corpus(size, lang, seed=1)
+        return lambda: order_key(long_key, lang)
+
+    def prepare_get_potential_table_sizes(size: int) -> Callable[[], Any]:
+        return lambda: get_potential_table_sizes(size)
+
+    return {
+        "luigi_sacco_encrypt": prepare_luigi_sacco_encrypt,
+        "luigi_sacco_decrypt": prepare_luigi_sacco_decrypt,
+        "route_encrypt": prepare_route_encrypt,
+        "route_decrypt": prepare_route_decrypt,
+        "order_key": prepare_order_key,
+        "get_potential_table_sizes": prepare_get_potential_table_sizes,
+    }
+
+
+def fit_exponent(sizes: List[int], seconds: List[float]) -> Optional[float]:
+    """
+    Returns the slope of the least squares line through log(seconds) against
+    log(size), using only sizes of at least MIN_FIT_SIZE. Returns None if
+    there are fewer than two such sizes, since smaller ones would mix in the
+    plan cache path.
+    """
+    points = [(math.log(size), math.log(elapsed)) for size, elapsed in zip(sizes, seconds)
+              if elapsed > 0 and size >= MIN_FIT_SIZE]
+
+    if len(points) < 2:
+        return None
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+def run_benchmarks(max_size: int = DEFAULT_MAX_SIZE, lang: str = "EN", repeat: int = 3,
+                   paths: Optional[List[str]] = None, verbose: bool = False) -> Dict[str, Any]:
+    """
+    Times every cipher path (or only the given ones) on inputs from MIN_SIZE
+    up to max_size, and returns the timings and fitted exponents
+    """
+    cases = get_benchmark_cases(lang)
+
+    if paths is not None:
+        unknown_paths = [path for path in paths if path not in cases]
+
+        if unknown_paths:
+            raise ValueError(f"Unsupported Benchmark ({', '.join(unknown_paths)})")
+
+        cases = {path: cases[path] for path in paths}
+
+    sizes = [multiple * 10**power
+             for power in range(int(math.log10(MIN_SIZE)), int(math.log10(max_size)) + 1)
+             for multiple in (1, 3)
+             if multiple * 10**power <= max_size]
+
+    results: Dict[str, Any] = {}
+
+    for path, prepare in cases.items():
+        seconds = []
+
+        for size in sizes:
+            # Largest inputs take long enough to not need repeating
+            elapsed = _time_call(prepare(size), repeat if size < 10**6 else 1, _clear_caches)
+            seconds.append(elapsed)
+
+            if verbose:
+                print(f"{path:>26} {size:>10} {elapsed:>12.6f}s", file=sys.stderr)
+
+        results[path] = {"sizes": sizes, "seconds": seconds, "exponent": fit_exponent(sizes, seconds)}
+
+    return {
+        "python": platform.python_version(),
+        "lang": lang,
+        "results": results,
+    }
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """
+    Returns a description of every regression in given results against given
+    baseline: a size that got slower by more than the tolerance, or an
+    exponent that grew by more than EXPONENT_TOLERANCE
+    """
+    if results["lang"] != baseline["lang"]:
+        raise ValueError(f"Cannot compare {results['lang']} results against a {baseline['lang']} baseline")
+
+    regressions = []
+
+    for path, result in results["results"].items():
+        baseline_result = baseline["results"].get(path)
+
+        if baseline_result is None:
+            continue
+
+        baseline_seconds = dict(zip(baseline_result["sizes"], baseline_result["seconds"]))
+
+        for size, elapsed in zip(result["sizes"], result["seconds"]):
+            old_elapsed = baseline_seconds.get(size)
+
+            if old_elapsed is None or old_elapsed < MIN_COMPARED_SECONDS:
+                continue
+
+            if elapsed > old_elapsed * (1 + tolerance):
+                regressions.append(
+                    f"{path} at size {size}: {old_elapsed:.6f}s -> {elapsed:.6f}s ({elapsed / old_elapsed:.2f}x)")
+
+        exponent, old_exponent = result["exponent"], baseline_result["exponent"]
+
+        if exponent is not None and old_exponent is not None and exponent > old_exponent + EXPONENT_TOLERANCE:
+            regressions.append(f"{path} exponent: {old_exponent:.2f} -> {exponent:.2f}")
+
+    return regressions
+
+
+def check_exponents(results: Dict[str, Any]) -> List[str]:
+    """
+    Returns a description of every path in LINEAR_PATHS whose fitted exponent
+    is further than LINEAR_EXPONENT_TOLERANCE from 1. Paths without an exponent
+    (too few sizes past MIN_FIT_SIZE) are skipped.
+    """
+    failures = []
+
+    for path in LINEAR_PATHS:
+        result = results["results"].get(path)
+
+        if result is None or result["exponent"] is None:
+            continue
+
+        if abs(result["exponent"] - 1) > LINEAR_EXPONENT_TOLERANCE:
+            failures.append(f"{path} exponent is {result['exponent']:.2f}, expected about 1")
+
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+
+    parser = argparse.ArgumentParser(
+        prog="python -m logic.benchmark",
+        description="Times every cipher path across input sizes and fits their complexity exponents"
+    )
+
+    parser.add_argument("--output", help="JSON file to write results to (printed to stdout if not given)")
+    parser.add_argument("--compare", metavar="BASELINE", help="JSON file of earlier results to flag regressions against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slow down before a size counts as a regression")
+    parser.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE, help="largest input size (up to 10^7)")
+    parser.add_argument("--lang", default="EN", choices=sorted(KEYS), help="language of the synthetic corpus")
+    parser.add_argument("--repeat", type=int, default=3, help="number of timed calls per size, of which the best is kept")
+    parser.add_argument("--path", action="append", dest="paths", help="only run given path (can be repeated)")
+
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.max_size, args.lang, args.repeat, args.paths, verbose=True)
+
+    output = json.dumps(results, indent=2)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as _file:
+            _file.write(output + "\n")
+    else:
+        print(output)
+
+    for path, result in results["results"].items():
+        exponent = result["exponent"]
+        print(f"{path:>26} ~ n^{exponent:.2f}" if exponent is not None else f"{path:>26} ~ n^?", file=sys.stderr)
+
+    failures = check_exponents(results)
+
+    for failure in failures:
+        print(f"SCALING {failure}", file=sys.stderr)
+
+    regressions: List[str] = []
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as _file:
+            baseline = json.load(_file)
+
+        regressions = compare_results(results, baseline, args.tolerance)
+
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+
+        if not regressions:
+            print("No regressions against baseline", file=sys.stderr)
+
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+
+    main()
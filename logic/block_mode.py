@@ -0,0 +1,156 @@
+from typing import Iterable, Iterator, List
+
+from . import tracing
+from .luigi_sacco import PLAN_CACHE_MAX_LENGTH, decrypt_with_splits, encrypt_with_splits, get_luigi_sacco_plan, order_key
+from .normalization import normalize_text
+
+
+# NOTE
+#   Block mode splits the (normalized) input into blocks of exactly block_size
+#   letters and applies the key's transposition to each block on its own.
+#
+#   The last block is whatever is left over once the input runs out, so it may
+#   be shorter than block_size. It is transposed as a message of its own length,
+#   which keeps the output exactly as long as the input. Since decryption splits
+#   its input into blocks of the same size, the last block it sees has the same
+#   length as the one that was encrypted, and the stream round-trips exactly.
+#
+#   Output of block mode is only the same as luigi_sacco_encrypt when the whole
+#   message fits in one block.
+
+DEFAULT_BLOCK_SIZE = 4096
+
+
+def iter_blocks(chunks: Iterable[str], block_size: int) -> Iterator[str]:
+    """
+    Regroups given chunks of text into blocks of exactly block_size characters.
+    The last block holds whatever is left and may be shorter. Never holds more
+    than one block and one chunk in memory.
+    """
+    if block_size <= 0:
+        raise ValueError(f"Block size must be positive (got {block_size})")
+
+    pending: List[str] = []
+    pending_length = 0
+
+    for chunk in chunks:
+        while chunk:
+            needed = block_size - pending_length
+
+            pending.append(chunk[:needed])
+            pending_length += len(pending[-1])
+            chunk = chunk[needed:]
+
+            if pending_length == block_size:
+                yield ''.join(pending)
+
+                pending = []
+                pending_length = 0
+
+    if pending_length > 0:
+        yield ''.join(pending)
+
+
+def _iter_normalized_chunks(chunks: Iterable[str], lang: str) -> Iterator[str]:
+    """
+    Normalizes and validates every chunk as it comes in
+    """
+    for chunk in chunks:
+        with tracing.span("normalize", len(chunk)):
+            normalized_chunk = normalize_text(chunk, lang)
+
+        yield normalized_chunk
+
+
+def transpose_block(key: str, block: str, lang: str, reverse: bool = False) -> str:
+    """
+    Encrypts (or decrypts when reverse is True) a single block with given
+    (already normalized) key
+    """
+    if len(block) <= PLAN_CACHE_MAX_LENGTH:
+        plan = get_luigi_sacco_plan(key, lang, len(block))
+        return plan.decrypt(block) if reverse else plan.encrypt(block)
+
+    splits = order_key(key, lang)
+
+    return decrypt_with_splits(splits, block) if reverse else encrypt_with_splits(splits, block)
+
+
+def _transpose_stream(key: str, chunks: Iterable[str], lang: str, block_size: int, reverse: bool) -> Iterator[str]:
+    """
+    Encrypts (or decrypts when reverse is True) given chunks block by block
+    """
+    key = normalize_text(key, lang, "key")
+
+    for block in iter_blocks(_iter_normalized_chunks(chunks, lang), block_size):
+        with tracing.span("transpose", len(block)):
+            transposed_block = transpose_block(key, block, lang, reverse)
+
+        yield transposed_block
+
+
+def encrypt_stream(key: str, chunks: Iterable[str], lang: str = "TR", block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Encrypts given iterable of text chunks in block mode and yields one
+    encrypted block at a time.
+
+    Chunks can have any size, they are normalized like the input of
+    luigi_sacco_encrypt and regrouped into blocks of block_size letters.
+    """
+    return _transpose_stream(key, chunks, lang, block_size, reverse=False)
+
+
+def decrypt_stream(key: str, chunks: Iterable[str], lang: str = "TR", block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[str]:
+    """
+    Decrypts given iterable of encrypted text chunks in block mode and yields
+    one decrypted block at a time.
+
+    block_size has to be the same one that was used to encrypt the stream.
+    """
+    return _transpose_stream(key, chunks, lang, block_size, reverse=True)
+
+
+def execute_tests() -> None:
+    """
+    Round-trips a few messages through block mode with different chunk and
+    block sizes.
+    """
+
+    messages = [
+        "Whatawonderfulworldwelivein",
+        "Telleveryonethattheirmessageshouldnotbe too long otherwise the encryption algorithm has trouble with it",
+        "short"
+    ]
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    for message in messages:
+        for block_size in [1, 5, 16, 10000]:
+            for chunk_size in [1, 3, 7, 1000]:
+
+                chunks = [message[i:i+chunk_size] for i in range(0, len(message), chunk_size)]
+
+                encrypted_blocks = list(encrypt_stream("helloworld", chunks, "EN", block_size))
+                decrypted_message = ''.join(decrypt_stream("helloworld", encrypted_blocks, "EN", block_size))
+
+                total += 1
+
+                if decrypted_message == normalize_text(message, "EN"):
+                    total_correct += 1
+
+                else:
+                    faulty_tests.append((message, block_size, chunk_size))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    execute_tests()
@@ -0,0 +1,324 @@
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import math
+import random
+import re
+import time
+
+from .alphabets import get_alphabet, register_alphabet_cache
+from .encoding import decode_text, encode_text
+from .luigi_sacco import transpose_with_splits
+
+
+# NOTE
+#   Luigi Sacco keys only matter through their column splits (see order_key),
+#   so recovering a message without its key means searching over permutations
+#   of 1..key_length. Every restart starts from a random permutation and keeps
+#   swapping two of its entries, accepting swaps that make the decryption look
+#   more like the language (simulated annealing, or plain hill climbing when
+#   the temperature is 0).
+#
+#   Candidates are scored with n-gram log probabilities held in a flat array
+#   indexed by the alphabet indices of the letters. Every candidate is decrypted
+#   and scored in full: swapping two splits changes the length of every row,
+#   so most of the decryption moves and there is nothing to gain from only
+#   rescoring what changed.
+
+# Short samples used to build the default n-gram tables. Pass a bigger corpus to
+# NGramTable.from_corpus for better results.
+SAMPLE_CORPORA = {
+    "EN": (
+        "It was the best of times and it was the worst of times. The people of the town gathered every "
+        "morning at the market to trade their goods and to hear the news from the capital. Nobody knew "
+        "when the soldiers would arrive, but everyone agreed that the harvest had to be brought in before "
+        "the first snow. The old man who kept the inn said that he had seen such winters before and that "
+        "they always ended with a long and quiet spring. His daughter wrote letters to her brother in the "
+        "army, asking him to come home as soon as the war was over. There is nothing more important than "
+        "the safety of the family, she wrote, and nothing more beautiful than the sound of the river in "
+        "the evening. The messages were carried by riders who travelled through the night, and some of "
+        "them were written in secret so that the enemy could not read them."
+    ),
+    "TR": (
+        "Adalet mülkün temelidir ve devletin en önemli görevi halkın güvenliğini sağlamaktır. Sabah erkenden "
+        "pazara giden insanlar hem alışveriş yapar hem de şehirden gelen haberleri dinlerdi. Kimse askerlerin "
+        "ne zaman geleceğini bilmiyordu ama herkes hasadın ilk kardan önce toplanması gerektiğini biliyordu. "
+        "Hanı işleten yaşlı adam böyle kışları daha önce de gördüğünü ve hepsinin uzun ve sakin bir baharla "
+        "bittiğini söyledi. Kızı ordudaki kardeşine mektuplar yazıyor, savaş biter bitmez eve dönmesini "
+        "istiyordu. Ailenin güvenliğinden daha önemli bir şey yoktur diye yazdı, akşam nehrin sesinden daha "
+        "güzel bir şey de yoktur. Mektuplar gece boyunca yol alan atlılar tarafından taşınırdı ve bazıları "
+        "düşman okuyamasın diye gizli yazılırdı."
+    )
+}
+
+
+class NGramTable:
+    """
+    Log probabilities of every n-gram of an alphabet, in a flat array indexed by
+    the base-(alphabet size) number formed by the alphabet indices of its
+    letters. N-grams never seen in the corpus get a floor probability.
+    """
+
+    def __init__(self, lang: str, n: int, log_probabilities: array) -> None:
+        self.lang = lang
+        self.n = n
+        self.alphabet_size = len(get_alphabet(lang).letters)
+        self.log_probabilities = log_probabilities
+
+    @classmethod
+    def from_corpus(cls, corpus: str, lang: str, n: int = 3) -> 'NGramTable':
+        """
+        Counts n-grams of given corpus, ignoring anything that is not a letter of
+        given language
+        """
+        alphabet = get_alphabet(lang)
+        alphabet_size = len(alphabet.letters)
+
+        letters = alphabet.invalid_character_pattern.sub('', corpus.translate(alphabet.normalization_table))
+        indices = encode_text(letters, lang)
+
+        counts = array('d', [0.0]) * alphabet_size ** n
+
+        for i in range(len(indices) - n + 1):
+            counts[_get_ngram_index(indices, i, n, alphabet_size)] += 1
+
+        total = max(sum(counts), 1.0)
+        floor = math.log10(0.01 / total)
+
+        log_probabilities = array('d', [math.log10(count / total) if count else floor for count in counts])
+
+        return cls(lang, n, log_probabilities)
+
+    def score_range(self, indices: bytes, start: int, stop: int) -> float:
+        """
+        Returns the sum of log probabilities of the n-grams starting between
+        given start and stop in given buffer of alphabet indices
+        """
+        stop = min(stop, len(indices) - self.n + 1)
+
+        if stop <= start:
+            return 0.0
+
+        size = self.alphabet_size
+        table = self.log_probabilities
+
+        if self.n == 1:
+            return sum(map(table.__getitem__, indices[start:stop]))
+
+        if self.n == 2:
+            return sum(table[a * size + b] for a, b in zip(indices[start:stop], indices[start + 1:stop + 1]))
+
+        if self.n == 3:
+            square = size * size
+            return sum(table[a * square + b * size + c] for a, b, c in
+                       zip(indices[start:stop], indices[start + 1:stop + 1], indices[start + 2:stop + 2]))
+
+        return sum(table[_get_ngram_index(indices, i, self.n, size)] for i in range(start, stop))
+
+    def score(self, indices: bytes) -> float:
+        """
+        Returns the sum of log probabilities of all n-grams in given buffer
+        """
+        return self.score_range(indices, 0, len(indices))
+
+
+def _get_ngram_index(indices: bytes, position: int, n: int, alphabet_size: int) -> int:
+    """
+    Returns the index of the n-gram starting at given position in an n-gram table
+    """
+    ngram_index = 0
+
+    for letter_index in indices[position:position + n]:
+        ngram_index = ngram_index * alphabet_size + letter_index
+
+    return ngram_index
+
+
+def get_sample_corpus(lang: str) -> str:
+    """
+    Returns the sample corpus of given language
+    """
+    if lang not in SAMPLE_CORPORA:
+        raise ValueError(f"No sample corpus for language ({lang}), build an NGramTable from your own corpus instead")
+
+    return SAMPLE_CORPORA[lang]
+
+
+@register_alphabet_cache
+@lru_cache(maxsize=None)
+def get_default_ngram_table(lang: str, n: int = 3) -> NGramTable:
+    """
+    Returns an n-gram table built from the sample corpus of given language
+    """
+    return NGramTable.from_corpus(get_sample_corpus(lang), lang, n)
+
+
+def decrypt_candidate(splits: List[int], encrypted_indices: bytes) -> bytes:
+    """
+    Decrypts given buffer of alphabet indices with given column splits
+    """
+    plain_indices = bytearray(len(encrypted_indices))
+
+    transpose_with_splits(splits, encrypted_indices, plain_indices, reverse=True)
+
+    return bytes(plain_indices)
+
+
+class Candidate(NamedTuple):
+    score: float
+    splits: List[int]
+    plain_text: str
+
+
+class SearchReport(NamedTuple):
+    candidates: List[Candidate]
+    candidates_evaluated: int
+    elapsed: float
+    candidates_per_second: float
+    stopped_early: bool
+
+
+def _run_restart(encrypted_indices: bytes, key_length: int, table: NGramTable, seed: int, max_iterations: int,
+                 patience: int, temperature: float, cooling: float, target_score: Optional[float],
+                 deadline: Optional[float]) -> Tuple[float, List[int], int, bool]:
+    """
+    Runs a single restart of the search and returns its best score and splits,
+    the number of candidates it evaluated and whether it reached the target
+    """
+    rng = random.Random(seed)
+
+    splits = list(range(1, key_length + 1))
+    rng.shuffle(splits)
+
+    score = table.score(decrypt_candidate(splits, encrypted_indices))
+
+    best_score, best_splits = score, list(splits)
+
+    evaluated = 1
+    since_improvement = 0
+
+    for _ in range(max_iterations):
+        if key_length < 2 or since_improvement >= patience:
+            break
+
+        if target_score is not None and best_score >= target_score:
+            break
+
+        if deadline is not None and time.time() >= deadline:
+            break
+
+        a, b = rng.sample(range(key_length), 2)
+        splits[a], splits[b] = splits[b], splits[a]
+
+        new_score = table.score(decrypt_candidate(splits, encrypted_indices))
+        delta = new_score - score
+
+        evaluated += 1
+
+        accept = delta >= 0 or (temperature > 0 and rng.random() < math.exp(delta / temperature))
+
+        if accept:
+            score = new_score
+
+        else:
+            splits[a], splits[b] = splits[b], splits[a]
+
+        if score > best_score:
+            best_score, best_splits = score, list(splits)
+            since_improvement = 0
+
+        else:
+            since_improvement += 1
+
+        temperature *= cooling
+
+    reached_target = target_score is not None and best_score >= target_score
+
+    return best_score, best_splits, evaluated, reached_target
+
+
+def crack_luigi_sacco(encrypted_text: str, key_lengths: Iterable[int], lang: str = "TR",
+                      table: Optional[NGramTable] = None, restarts: int = 8, workers: Optional[int] = None,
+                      max_iterations: int = 20000, patience: int = 2000, temperature: float = 0.0,
+                      cooling: float = 0.999, target_score: Optional[float] = None,
+                      time_limit: Optional[float] = None, seed: int = 0, top: int = 5) -> SearchReport:
+    """
+    Searches for the column splits of a Luigi Sacco message without knowing its
+    key, trying every given key length with the given number of restarts each.
+
+    Restarts run on a pool of worker processes. Every restart stops after
+    max_iterations swaps, after patience swaps without improvement, once the
+    time limit (in seconds) is up, or once a candidate reaches target_score,
+    which also cancels any restart that hasn't started yet.
+    """
+    alphabet = get_alphabet(lang)
+
+    encrypted_text = re.sub(r"\s", "", encrypted_text).translate(alphabet.normalization_table)
+    encrypted_indices = encode_text(encrypted_text, lang)
+
+    table = table or get_default_ngram_table(lang)
+
+    start = time.time()
+    deadline = start + time_limit if time_limit is not None else None
+
+    candidates: List[Candidate] = []
+    evaluated = 0
+    stopped_early = False
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+
+        for key_length in key_lengths:
+            for restart in range(restarts):
+                pending.add(executor.submit(
+                    _run_restart, encrypted_indices, key_length, table, seed + restart * 7919 + key_length,
+                    max_iterations, patience, temperature, cooling, target_score, deadline
+                ))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                if future.cancelled():
+                    continue
+
+                score, splits, restart_evaluated, reached_target = future.result()
+
+                evaluated += restart_evaluated
+                candidates.append(Candidate(score, splits, decode_text(decrypt_candidate(splits, encrypted_indices), lang)))
+
+                if reached_target and not stopped_early:
+                    stopped_early = True
+
+                    for other in pending:
+                        other.cancel()
+
+    elapsed = time.time() - start
+
+    # Different restarts often land on the same splits
+    unique_candidates = {tuple(candidate.splits): candidate for candidate in candidates}
+    best_candidates = sorted(unique_candidates.values(), key=lambda candidate: candidate.score, reverse=True)[:top]
+
+    return SearchReport(best_candidates, evaluated, elapsed, evaluated / elapsed if elapsed > 0 else 0.0, stopped_early)
+
+
+if __name__ == '__main__':
+
+    from .luigi_sacco import luigi_sacco_encrypt, order_key
+
+    message = SAMPLE_CORPORA["EN"]
+    key = "SECRET"
+
+    encrypted_message = luigi_sacco_encrypt(key, re.sub(r"[^A-Za-z]", "", message), "EN")
+
+    report = crack_luigi_sacco(encrypted_message, [len(key)], "EN", restarts=8)
+
+    print(f"Evaluated {report.candidates_evaluated} candidates in {report.elapsed:.2f}s "
+          f"({report.candidates_per_second:.0f} candidates / s)")
+
+    print(f"\nActual splits: {order_key(key, 'EN')}")
+
+    for candidate in report.candidates:
+        print(f"\n{candidate.score:.1f} {candidate.splits}\n\t{candidate.plain_text[:80]}")
@@ -0,0 +1,94 @@
+from typing import Union
+
+from .alphabets import INVALID_RANK, get_alphabet
+
+
+# NOTE
+#   Encoded text is a bytes-like buffer holding the index of every letter in the
+#   alphabet of its language, one byte per letter. Ciphers can transpose these
+#   buffers directly, so text can stay encoded between calls and be passed
+#   around as memoryviews without being decoded again.
+#
+#   Encoding translates letters to characters whose code points are their
+#   indices, which then encode to bytes 1:1 through latin-1, so both directions
+#   are a couple of C-level passes.
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def encode_text(text: str, lang: str) -> bytes:
+    """
+    Returns given (normalized) text as a buffer of alphabet indices
+    """
+    indices = text.translate(get_alphabet(lang).rank_table)
+
+    if INVALID_RANK in indices:
+        raise ValueError(f"Given text does not seem to belong to the group '{lang}'")
+
+    return indices.encode('latin-1')
+
+
+def decode_text(buffer: Buffer, lang: str) -> str:
+    """
+    Returns the text held by given buffer of alphabet indices
+    """
+    decoded_text = str(buffer, 'latin-1').translate(get_alphabet(lang).decode_table)
+
+    if INVALID_RANK in decoded_text:
+        raise ValueError(f"Given buffer holds indices outside of the alphabet of '{lang}'")
+
+    return decoded_text
+
+
+def execute_tests() -> None:
+    """
+    Round-trips encoded messages through both ciphers and compares them against
+    the string functions.
+    """
+    from .luigi_sacco import luigi_sacco_encrypt, luigi_sacco_encrypt_buffer, luigi_sacco_decrypt_buffer
+    from .route_encryption import get_potential_table_sizes, route_encrypt, route_encrypt_buffer, route_decrypt_buffer
+
+    messages = [
+        ("WHATAWONDERFULWORLDWELIVEIN", "EN"),
+        ("ADALETMÜLKÜNTEMELİDİR", "TR"),
+        ("IİIŞĞÇÖÜ" * 1000, "TR")
+    ]
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    for message, lang in messages:
+        buffer = encode_text(message, lang)
+
+        _, table_size = get_potential_table_sizes(len(message))
+
+        encrypted_buffer = luigi_sacco_encrypt_buffer("TERAZI", memoryview(buffer), lang)
+        route_encrypted_buffer = route_encrypt_buffer(memoryview(buffer), table_size)
+
+        checks = [
+            len(buffer) == len(message),
+            decode_text(buffer, lang) == message,
+            decode_text(encrypted_buffer, lang) == luigi_sacco_encrypt("TERAZI", message, lang),
+            luigi_sacco_decrypt_buffer("TERAZI", encrypted_buffer, lang) == buffer,
+            decode_text(route_encrypted_buffer, lang) == route_encrypt(message, table_size),
+            route_decrypt_buffer(route_encrypted_buffer, table_size) == buffer
+        ]
+
+        total += len(checks)
+        total_correct += sum(checks)
+
+        if not all(checks):
+            faulty_tests.append((message[:30], lang, checks))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    execute_tests()
@@ -0,0 +1,267 @@
+from typing import Callable, Optional, Tuple
+
+import mmap
+import os
+import shutil
+import stat
+import tempfile
+
+from .alphabets import get_alphabet
+from .luigi_sacco import order_key, transpose_with_splits
+from .normalization import normalize_text
+from .route_encryption import get_potential_table_sizes, transpose_route
+
+
+# NOTE
+#   Files are transposed byte by byte through memory maps, without ever being
+#   read into memory as a whole or decoded.
+#
+#   For Luigi Sacco this means files must already be formatted (upper case, no
+#   spaces or line breaks) and stored in a single byte encoding so that every
+#   letter is exactly one byte. Route encryption accepts any bytes.
+
+# Files are validated this many bytes at a time
+VALIDATION_BLOCK_SIZE = 1 << 20
+
+
+def _transpose_file(source_path: str, destination_path: Optional[str], transpose: Callable[[mmap.mmap, mmap.mmap], None]) -> None:
+    """
+    Maps given source file and a destination file of the same size, then lets
+    the given transpose function move the bytes from one to the other.
+
+    If no destination is given (or it is the source itself), output goes to a
+    temporary file next to the source which then replaces it. The temporary
+    file gets the mode of the source, and its owner and group where the OS
+    lets us set them.
+    """
+    in_place = destination_path is None or os.path.abspath(destination_path) == os.path.abspath(source_path)
+
+    if in_place:
+        file_descriptor, output_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(source_path)))
+        os.close(file_descriptor)
+
+    else:
+        output_path = destination_path
+
+    try:
+        if in_place:
+            _copy_mode_and_owner(source_path, output_path)
+
+        with open(source_path, 'rb') as source_file, open(output_path, 'w+b') as destination_file:
+            file_size = os.fstat(source_file.fileno()).st_size
+
+            # Empty files cannot be mapped, and there's nothing to transpose anyway
+            if file_size > 0:
+                destination_file.truncate(file_size)
+
+                with mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) as source, \
+                        mmap.mmap(destination_file.fileno(), file_size) as destination:
+
+                    transpose(source, destination)
+
+                    destination.flush()
+
+        if in_place:
+            os.replace(output_path, source_path)
+
+    except BaseException:
+        if in_place and os.path.exists(output_path):
+            os.remove(output_path)
+
+        raise
+
+
+def _copy_mode_and_owner(source_path: str, destination_path: str) -> None:
+    """
+    Gives destination file the permission bits of source file, and its owner
+    and group if possible (which usually needs to run as root)
+    """
+    shutil.copymode(source_path, destination_path)
+
+    if not hasattr(os, "chown"):
+        return
+
+    source_stat = os.stat(source_path)
+
+    try:
+        os.chown(destination_path, source_stat.st_uid, source_stat.st_gid)
+
+    except PermissionError:
+        pass
+
+
+def confirm_file_in_correct_lang(source: mmap.mmap, lang: str) -> None:
+    """
+    Checks whether given mapped file has any bytes that are not letters of the
+    given language in its file encoding. Reads the file one block at a time.
+    """
+    alphabet = get_alphabet(lang)
+
+    if alphabet.file_encoding is None:
+        raise ValueError(f"Language '{lang}' has no single byte encoding to use in file mode")
+
+    alphabet_bytes = alphabet.letters.encode(alphabet.file_encoding)
+
+    for block_start in range(0, len(source), VALIDATION_BLOCK_SIZE):
+        block = source[block_start:block_start + VALIDATION_BLOCK_SIZE]
+
+        if block.translate(None, alphabet_bytes):
+            raise ValueError(
+                f"Given file does not seem to belong to the group '{lang}' "
+                f"(expected upper case letters encoded as {alphabet.file_encoding})")
+
+
+def _transpose_luigi_sacco_file(key: str, source_path: str, destination_path: Optional[str], lang: str, reverse: bool) -> None:
+    """
+    Encrypts (or decrypts when reverse is True) given file with Luigi Sacco
+    """
+    key = normalize_text(key, lang, "key")
+
+    splits = order_key(key, lang)
+
+    def transpose(source: mmap.mmap, destination: mmap.mmap) -> None:
+        confirm_file_in_correct_lang(source, lang)
+        transpose_with_splits(splits, source, destination, reverse=reverse)
+
+    _transpose_file(source_path, destination_path, transpose)
+
+
+def luigi_sacco_encrypt_file(key: str, source_path: str, destination_path: Optional[str] = None, lang: str = "TR") -> None:
+    """
+    Encrypts given file using given key. Writes to destination path if given,
+    otherwise the file is encrypted in place.
+
+    The file must hold formatted plain text encoded in the file encoding of the
+    alphabet of given language.
+    """
+    _transpose_luigi_sacco_file(key, source_path, destination_path, lang, reverse=False)
+
+
+def luigi_sacco_decrypt_file(key: str, source_path: str, destination_path: Optional[str] = None, lang: str = "TR") -> None:
+    """
+    Decrypts given file using given key. Writes to destination path if given,
+    otherwise the file is decrypted in place.
+    """
+    _transpose_luigi_sacco_file(key, source_path, destination_path, lang, reverse=True)
+
+
+def _transpose_route_file(source_path: str, table_size: Optional[Tuple[int, int]], destination_path: Optional[str], reverse: bool) -> None:
+    """
+    Encrypts (or decrypts when reverse is True) given file with E4 & B3 routes
+    """
+    def transpose(source: mmap.mmap, destination: mmap.mmap) -> None:
+        size = table_size
+
+        if size is None:
+            _, size = get_potential_table_sizes(len(source))
+
+        transpose_route(source, destination, size, reverse=reverse)
+
+    _transpose_file(source_path, destination_path, transpose)
+
+
+def route_encrypt_file(source_path: str, table_size: Optional[Tuple[int, int]] = None, destination_path: Optional[str] = None) -> None:
+    """
+    Encrypts bytes of given file across a table of given size according to E4
+    & B3 routes. Uses the optimal table size if none is given. Writes to
+    destination path if given, otherwise the file is encrypted in place.
+    """
+    _transpose_route_file(source_path, table_size, destination_path, reverse=False)
+
+
+def route_decrypt_file(source_path: str, table_size: Optional[Tuple[int, int]] = None, destination_path: Optional[str] = None) -> None:
+    """
+    Decrypts bytes of given file according to given table size. Writes to
+    destination path if given, otherwise the file is decrypted in place.
+    """
+    _transpose_route_file(source_path, table_size, destination_path, reverse=True)
+
+
+def execute_tests() -> None:
+    """
+    Round-trips a few messages through files and compares them against the
+    string functions.
+    """
+    from .luigi_sacco import luigi_sacco_encrypt
+    from .route_encryption import route_encrypt
+
+    messages = [
+        ("HELLOWORLD", "EN"),
+        ("WHATAWONDERFULWORLDWELIVEIN" * 50, "EN"),
+        ("ADALETMÜLKÜNTEMELİDİR" * 20, "TR"),
+        ("A", "EN"),
+        ("", "EN")
+    ]
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        source_path = os.path.join(directory, "message.txt")
+        encrypted_path = os.path.join(directory, "encrypted.txt")
+
+        for message, lang in messages:
+            encoding = get_alphabet(lang).file_encoding
+
+            with open(source_path, 'wb') as _file:
+                _file.write(message.encode(encoding))
+
+            luigi_sacco_encrypt_file("THISISAKEY", source_path, encrypted_path, lang)
+
+            with open(encrypted_path, 'rb') as _file:
+                encrypted_correctly = _file.read().decode(encoding) == luigi_sacco_encrypt("THISISAKEY", message, lang)
+
+            # Decrypting in place replaces the file, which must keep its mode
+            os.chmod(encrypted_path, 0o640)
+
+            luigi_sacco_decrypt_file("THISISAKEY", encrypted_path, lang=lang)
+
+            with open(encrypted_path, 'rb') as _file:
+                decrypted_correctly = _file.read().decode(encoding) == message
+
+            mode_kept = stat.S_IMODE(os.stat(encrypted_path).st_mode) == 0o640
+
+            total += 1
+
+            if encrypted_correctly and decrypted_correctly and mode_kept:
+                total_correct += 1
+
+            else:
+                faulty_tests.append(("Luigi Sacco", message, lang))
+
+            if len(message) == 0:
+                continue
+
+            sizes, _ = get_potential_table_sizes(len(message))
+
+            for size in sizes:
+                route_encrypt_file(source_path, size, encrypted_path)
+
+                with open(encrypted_path, 'rb') as _file:
+                    encrypted_correctly = _file.read().decode(encoding) == route_encrypt(message, size)
+
+                route_decrypt_file(encrypted_path, size)
+
+                with open(encrypted_path, 'rb') as _file:
+                    decrypted_correctly = _file.read().decode(encoding) == message
+
+                total += 1
+
+                if encrypted_correctly and decrypted_correctly:
+                    total_correct += 1
+
+                else:
+                    faulty_tests.append(("Route", message, size))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    execute_tests()
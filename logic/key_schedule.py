@@ -0,0 +1,116 @@
+from typing import Dict, Iterable, List
+
+from .alphabets import INVALID_RANK, get_alphabet
+
+
+def get_key_ranks(key: str, lang: str) -> str:
+    """
+    Returns given key with every letter replaced by the character whose code
+    point is that letter's rank in the alphabet of given language
+    """
+    ranks = key.translate(get_alphabet(lang).rank_table)
+
+    if INVALID_RANK in ranks:
+        raise ValueError(f"Given key does not seem to belong to the group '{lang}'")
+
+    return ranks
+
+
+def order_key(key: str, lang: str) -> List[int]:
+    """
+    Returns the column splits of given key: the (1-based) positions of its
+    letters in alphabetical order.
+
+    NOTE
+        if key has repeating letters, then recurring letters are numbered
+        sequentially in order of appearance in key, which is exactly what a
+        stable sort does.
+    """
+    ranks = get_key_ranks(key, lang)
+
+    return [index + 1 for index in sorted(range(len(ranks)), key=ranks.__getitem__)]
+
+
+def order_keys(keys: Iterable[str], lang: str) -> List[List[int]]:
+    """
+    Returns the column splits of every given key, in the same order.
+
+    Keys are grouped by length and every group is ranked with a single stable
+    argsort when numpy is available. Falls back to order_key otherwise.
+    """
+    keys = list(keys)
+
+    try:
+        import numpy as np
+
+    except ImportError:
+        return [order_key(key, lang) for key in keys]
+
+    splits: List[List[int]] = [[] for _ in keys]
+
+    key_indices_by_length: Dict[int, List[int]] = {}
+
+    for key_index, key in enumerate(keys):
+        key_indices_by_length.setdefault(len(key), []).append(key_index)
+
+    for key_length, key_indices in key_indices_by_length.items():
+        if key_length == 0:
+            continue
+
+        # Ranks fit in a byte, so every group becomes one (N, key_length) array
+        ranks = ''.join(get_key_ranks(keys[i], lang) for i in key_indices).encode('latin-1')
+        rank_matrix = np.frombuffer(ranks, dtype=np.uint8).reshape(len(key_indices), key_length)
+
+        group_splits = (np.argsort(rank_matrix, axis=1, kind='stable') + 1).tolist()
+
+        for key_index, key_splits in zip(key_indices, group_splits):
+            splits[key_index] = key_splits
+
+    return splits
+
+
+def execute_tests() -> None:
+    """
+    Checks key orders against a few hand-worked keys
+    """
+
+    expected_orders = [
+        ("HELLOWORLD", "EN", [10, 2, 1, 3, 4, 9, 5, 7, 8, 6]),
+        ("SHORT", "EN", [2, 3, 4, 1, 5]),
+        ("AAA", "EN", [1, 2, 3]),
+        ("TERAZİ", "TR", [4, 2, 6, 3, 1, 5]),
+        ("IİI", "TR", [1, 3, 2]),
+        ("ÄAB", "DE", [2, 1, 3]),
+        ("ƏEX", "AZ", [2, 1, 3])
+    ]
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    for key, lang, expected_order in expected_orders:
+        total += 2
+
+        if order_key(key, lang) == expected_order:
+            total_correct += 1
+
+        else:
+            faulty_tests.append((key, lang, order_key(key, lang)))
+
+        if order_keys([key, key[::-1], key], lang)[2] == expected_order:
+            total_correct += 1
+
+        else:
+            faulty_tests.append((key, lang, "bulk"))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    execute_tests()
@@ -1,258 +1,302 @@
 
-from typing import Iterable, Literal, List, Tuple
+from functools import lru_cache
+import sys
+import time
+from typing import List, MutableSequence, Sequence, Tuple
 
-from .common import TURKISH_ALPHABET, ENGLISH_ALPHABET
+from . import tracing
+from .alphabets import get_alphabet, register_alphabet_cache
+from .encoding import Buffer
+from .key_schedule import order_key
+from .normalization import normalize_key_and_input_text, normalize_text
 
 
-def custom_sort(iterable: Iterable, lang: Literal["EN", "TR"]) -> Iterable:
-    """
-    Alphabetically sorts given iterable according to given lang parameter
-    """
-    if lang == "TR":
-        return sorted(
-            iterable,
-            key=lambda i: TURKISH_ALPHABET.get(i[0])
-        )
-
-    elif lang == "EN":
-        return sorted(
-            iterable,
-            key=lambda i: ENGLISH_ALPHABET.get(i[0])
-        )
+# Maximum number of compiled plans kept around by get_luigi_sacco_plan
+PLAN_CACHE_SIZE = 256
 
-    else:
-        raise ValueError(f"Unsupported Language ({lang})")
+# Messages longer than this skip the plan cache, since a compiled plan holds two
+# integer lists as long as the message itself
+PLAN_CACHE_MAX_LENGTH = 4096
 
 
-def get_letter_index_pairs(key: str, lang: Literal["EN", "TR"]) -> List[ Tuple[str, str] ]:
+def get_transposed(matrix: List[List['str']]) -> List[List['str']]:
     """
-    Returns a list of tuples where the first element in each tuple is a letter from the given key
-    and the second element is the position of that letter in the alphabet of the given langauge
+    Returns transpose of given matrix
     """
+    return list(map(list, zip(*matrix)))
 
-    if lang not in ["TR", "EN"]:
-        raise ValueError(f"Unsupported Language ({lang})")
-
-    # Used a list here instead of a dict to account for repeating letters in given Key
-    if lang == "TR":
-        return [[letter, TURKISH_ALPHABET[letter]] for letter in key]
 
-    elif lang == "EN":
-        return [[letter, ENGLISH_ALPHABET[letter]] for letter in key]
+def get_column_lengths(splits: List[int], message_length: int) -> List[int]:
+    """
+    Returns how many letters end up in every column (in column order, not in
+    the order the columns are read out) for a message of the given length.
 
+    Every full pass over the splits fills (key_length - col) letters into column
+    col, so only the last, partial pass has to be walked row by row.
+    """
+    key_length = len(splits)
+    cycle_length = key_length * (key_length + 1) // 2
 
-def order_key(key: str, lang: Literal["EN", "TR"]) -> List[int]:
+    full_cycles, remaining = divmod(message_length, cycle_length)
 
-    letter_index_pairs = get_letter_index_pairs(key, lang)
+    column_lengths = [full_cycles * (key_length - col) for col in range(key_length)]
 
-    # NOTE
-    #   if key has repeating letters, then recurring letters are numbered
-    #   sequentially in order of appearance in key
+    for split in splits:
+        row_length = min(split, remaining)
 
-    # Get column numbers based on alphabetical order of key
-    for letter_index, pair in enumerate(custom_sort(letter_index_pairs, lang)):
-        pair[1] = letter_index + 1
+        if row_length == 0:
+            break
 
-    return [letter_index_pairs.index(pair) + 1 for pair in custom_sort(letter_index_pairs, lang)]
+        for col in range(row_length):
+            column_lengths[col] += 1
 
+        remaining -= row_length
 
-def get_transposed(matrix: List[List['str']]) -> List[List['str']]:
-    """
-    Returns transpose of given matrix
-    """
-    return list(map(list, zip(*matrix)))
+    return column_lengths
 
 
-def get_indices_of_extra_letters(row: List[str], split: int, key_length: int) -> List[int]:
+def get_column_starts(splits: List[int], column_lengths: List[int]) -> List[int]:
     """
-    Returns indices of all letters which don't belong in a row because they make its length bigger
-    than the given split.
+    Returns the index in the encrypted text at which every column (in column
+    order) starts
     """
+    column_starts = [0] * len(splits)
+    current_index = 0
 
-    row_without_placeholder = ''.join(char for char in row if char != '_')
-    difference = len(row_without_placeholder) - split
+    for split in splits:
+        column_starts[split - 1] = current_index
+        current_index += column_lengths[split - 1]
 
-    difference = key_length - split
+    return column_starts
 
-    if difference == 0:
-        return []
 
-    # Extra letter indices start from the split's index and go till the end of that row
-    indices_of_extra_letters = [i for i in range(split, key_length)]
+def transpose_with_splits(splits: List[int], source: Sequence, destination: MutableSequence, reverse: bool = False) -> None:
+    """
+    Moves every element of source to its place in destination according to the
+    column splits of a key. Encrypts when reverse is False and decrypts when it
+    is True. Both sequences must have the same length.
+
+    Inside the full passes over the splits, the letters a row puts in one column
+    are exactly one pass length apart in the plain text and one 'rows in that
+    column per pass' apart in the encrypted text, so whole runs of them are
+    moved with one extended slice assignment. Only the last, partial pass is
+    walked letter by letter.
+    """
+    if len(splits) == 0:
+        raise ValueError("Cannot transpose with an empty key")
 
-    # Remove indices of '_' placeholders, and make sure the indices list is only
-    # as long as the original key
-    indices_of_extra_letters = [e for e in indices_of_extra_letters[:key_length] if row[e] != '_']
+    key_length = len(splits)
+    cycle_length = key_length * (key_length + 1) // 2
+    message_length = len(source)
 
-    return indices_of_extra_letters
+    full_cycles = message_length // cycle_length
+    full_length = full_cycles * cycle_length
 
+    column_lengths = get_column_lengths(splits, message_length)
+    column_starts = get_column_starts(splits, column_lengths)
 
-def recursive_push_down(matrix: List[List['str']], row: int, index_of_letter_to_be_pushed_down: int) -> None:
-    """
-    Recursive function to push down a given element in a matrix one row down.
+    if full_cycles > 0:
+        # Number of rows already placed in every column during a single pass
+        rows_seen = [0] * key_length
+        row_start = 0
 
-    If there is another element below the given element, then it is recursively
-    pushed down first.
+        for split in splits:
+            for col in range(split):
+                rows_per_cycle = key_length - col
+                start = column_starts[col] + rows_seen[col]
 
-    WARNING: This has not been tested if the entire column below the given element is full.
-    """
+                plain_slice = slice(row_start + col, full_length, cycle_length)
+                encrypted_slice = slice(start, start + full_cycles * rows_per_cycle, rows_per_cycle)
 
-    # Check if below space is empty or not (empty means '_')
-    if matrix[row + 1][index_of_letter_to_be_pushed_down] != '_':
-        recursive_push_down(matrix, row + 1, index_of_letter_to_be_pushed_down)
+                if reverse:
+                    destination[plain_slice] = source[encrypted_slice]
+                else:
+                    destination[encrypted_slice] = source[plain_slice]
 
-    # Place given element to at the row below its current row, and replace its
-    # original position with the placehoder '_'
-    matrix[row + 1][index_of_letter_to_be_pushed_down] = matrix[row][index_of_letter_to_be_pushed_down]
-    matrix[row][index_of_letter_to_be_pushed_down] = '_'
+                rows_seen[col] += 1
 
+            row_start += split
 
-def push_down(matrix: List[List['str']], row: int, split: int, verbose: bool, key_length: int):
-    """
-    Pushes all extra letters in given row of given matrix down one row.
-    """
+    # Letters of the last, partial pass come after the full passes in every column
+    positions = [column_starts[col] + full_cycles * (key_length - col) for col in range(key_length)]
+    current_index = full_length
 
-    # Get extra letter indices for this current row
-    indices_of_extra_letters = get_indices_of_extra_letters(matrix[row], split, key_length)
+    for split in splits:
+        row_length = min(split, message_length - current_index)
 
-    # Push each of these extra letters down one row
-    for i in indices_of_extra_letters:
+        if row_length <= 0:
+            break
 
-        recursive_push_down(matrix, row, i)
+        for col in range(row_length):
+            if reverse:
+                destination[current_index + col] = source[positions[col]]
+            else:
+                destination[positions[col]] = source[current_index + col]
 
-        if verbose:
-            print(f"\t\t\n\n\nIteration {i}")
-            [print(row) for row in matrix]
+            positions[col] += 1
 
+        current_index += row_length
 
-def distribute_letters_across_matrix(matrix: List[List['str']], splits: List[int], verbose: bool) -> List[List['str']]:
-    """
-    Algorithm works as follows:
-        Starting from first row, make sure there are only as many chars in it as the split
 
-        'PUSH' down any extra characters in the row to the row below it
+def encrypt_with_splits(splits: List[int], plain_text: str) -> str:
+    """
+    Encrypts given (already formatted) plain text using the column splits of a
+    key in a single O(n) pass, without building any matrix
+    """
+    encrypted_text = [''] * len(plain_text)
 
-        If the row below has characters filling up the space where we want to push
-        the extra characters, then push them down as well.
+    transpose_with_splits(splits, plain_text, encrypted_text)
 
-    """
+    return ''.join(encrypted_text)
 
-    # Copying matrix to avoid changing the passed in matrix
-    matrix = [[element for element in row] for row in matrix]
 
-    # NOTE
-    #   if we had a long message, we'd have more rows than there are splits.
-    #   I fix this by repeating the key as many times as needed
-    #
-    #   This is assuming that the luigi sacco transposition algorithm would
-    #   function like this in the first place, but who's checking?
-    #
+def decrypt_with_splits(splits: List[int], encrypted_text: str) -> str:
+    """
+    Decrypts given (already formatted) encrypted text using the column splits
+    of a key, placing every letter in its final position in a single O(n) pass
+    """
+    plain_text = [''] * len(encrypted_text)
 
-    extended_splits = [element for element in splits]
+    transpose_with_splits(splits, encrypted_text, plain_text, reverse=True)
 
-    while len(extended_splits) < len(matrix):
-        extended_splits += splits
+    return ''.join(plain_text)
 
-    # The key is cut at the amount of rows the matrix has to avoid IndexError exceptions
-    extended_splits = extended_splits[:len(matrix)]
 
-    # push down extra letters in each row so elements in matrix take correct positions
-    for (row_index, row), split in zip(enumerate(matrix), extended_splits):
-        if len(row) != split:
-            # Note: passing in original key length here because it's used to
-            # infer necessary number of columns in matrix
-            push_down(matrix, row_index, split, verbose, key_length=len(splits))
+def add_spaces(encrypted_text: str, word_lengths: List[int]) -> str:
+    """
+    Returns given encrypted text with a space between every word (column)
+    """
+    words = []
+    current_index = 0
 
-    if verbose:
-        print("\n\n\n\t\t*** SHAPE OF MATRIX AT THE END ***\n")
-        [print(row) for row in matrix]
-        print("\n\n")
+    for word_length in word_lengths:
+        words.append(encrypted_text[current_index:current_index + word_length])
+        current_index += word_length
 
-    return matrix
+    return ' '.join(words)
 
 
 def get_split_encrypted_text(key: str, encrypted_text: str, lang: str) -> List[str]:
     """
     Returns the given encrypted text (given without white spaces) split up into
-    correctly size chunks (words). This is done by encrypting a message of the
-    same size but setting the output to include white space, and inferring the
-    word sizes from it.
+    correctly size chunks (words). The word sizes are worked out directly from
+    the key and the length of the message.
     """
-    mock_msg = "A"*len(encrypted_text)
-
-    # This gives me the message in the shape that I need
-    mock_enc = luigi_sacco_encrypt(key, mock_msg, lang, with_spaces=True)
-
-    word_lengths = [len(word) for word in mock_enc.split(' ')]
+    splits = order_key(key, lang)
+    column_lengths = get_column_lengths(splits, len(encrypted_text))
 
     modded_encrypted_text = []
 
     current_index = 0
 
-    for i in word_lengths:
-        modded_encrypted_text.append(encrypted_text[current_index:current_index+i])
-        current_index += i
+    for split in splits:
+        word_length = column_lengths[split - 1]
+        modded_encrypted_text.append(encrypted_text[current_index:current_index+word_length])
+        current_index += word_length
 
     return modded_encrypted_text
 
 
-def confirm_text_in_correct_lang(text: str, lang: Literal["EN", "TR"]) -> None:
+def confirm_text_in_correct_lang(text: str, lang: str) -> None:
     """
     Checks whether given text has any characters that don't belong in the given
     language (such as Q or W in turkish)
     """
 
-    if lang not in ["EN", "TR"]:
-        raise ValueError(f"Given language is not supported ({lang})")
-
-    try:
-        if lang == "TR":
-            for char in text:
-                if char not in TURKISH_ALPHABET:
-                    raise ValueError()
-
-        elif lang == "EN":
-            for char in text:
-                if char not in ENGLISH_ALPHABET:
-                    raise ValueError()
-
-    except ValueError as e:
+    if get_alphabet(lang).invalid_character_pattern.search(text) is not None:
         raise ValueError(
             f"Given text does not seem to belong to the group '{lang}'")
 
 
-def format_key_and_input_text(key: str, input_text: str) -> Tuple[str, str]:
+class LuigiSaccoPlan:
     """
-    Returns a tuple of given key and input text stripped of all double spaces,
-    and converted into upper case letters.
+    Compiled form of the Luigi Sacco transposition for one key and one message
+    length.
+
+    The permutation maps every position of the encrypted message to the
+    position of the plain text letter it was taken from, and the inverse maps
+    the other way around. Word lengths are the lengths of the columns in the
+    order they are read out, which is needed to add spaces to the output.
     """
 
-    def format(x): return x.upper().replace(' ', '')
+    def __init__(self, splits: List[int], message_length: int) -> None:
+        if len(splits) == 0:
+            raise ValueError("Cannot compile a plan for an empty key")
 
-    formatted_key = format(key)
-    formatted_input_text = format(input_text)
+        self.splits = splits
+        self.message_length = message_length
 
-    return formatted_key, formatted_input_text
+        column_lengths = get_column_lengths(splits, message_length)
 
+        self.word_lengths: List[int] = [column_lengths[split - 1] for split in splits]
 
-### ENCRYPT
-def luigi_sacco_encrypt(key: str, plain_text: str, lang: Literal["EN", "TR"] = "TR", verbose: bool=False, with_spaces: bool = False) -> str:
+        # Transposing the positions themselves gives the permutation and its inverse
+        self.permutation: List[int] = [0] * message_length
+        transpose_with_splits(splits, range(message_length), self.permutation)
+
+        self.inverse: List[int] = [0] * message_length
+        transpose_with_splits(splits, range(message_length), self.inverse, reverse=True)
+
+    def encrypt(self, plain_text: str, with_spaces: bool = False) -> str:
+        """
+        Encrypts given (already formatted) plain text by gathering its letters
+        in the order of the permutation
+        """
+        if len(plain_text) != self.message_length:
+            raise ValueError(
+                f"Plan was compiled for messages of length {self.message_length}, got {len(plain_text)}")
+
+        encrypted_text = ''.join([plain_text[i] for i in self.permutation])
+
+        if with_spaces:
+            return add_spaces(encrypted_text, self.word_lengths)
+
+        return encrypted_text
+
+    def decrypt(self, encrypted_text: str) -> str:
+        """
+        Decrypts given (already formatted) encrypted text by gathering its
+        letters in the order of the inverse permutation
+        """
+        if len(encrypted_text) != self.message_length:
+            raise ValueError(
+                f"Plan was compiled for messages of length {self.message_length}, got {len(encrypted_text)}")
+
+        return ''.join([encrypted_text[i] for i in self.inverse])
+
+
+@register_alphabet_cache
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def get_luigi_sacco_plan(key: str, lang: str, message_length: int) -> LuigiSaccoPlan:
     """
-    Encrypts given plain text message using given key.
+    Returns the compiled plan for given (already formatted) key and message
+    length. Plans are kept in a bounded LRU cache so repeated traffic with the
+    same key skips compiling altogether.
     """
+    return LuigiSaccoPlan(order_key(key, lang), message_length)
 
-    key, plain_text = format_key_and_input_text(key, plain_text)
 
-    confirm_text_in_correct_lang(key, lang)
-    confirm_text_in_correct_lang(plain_text, lang)
+def get_plan_cache_info():
+    """
+    Returns hits, misses, maximum size and current size of the plan cache
+    """
+    return get_luigi_sacco_plan.cache_info()
 
-    # Get column splits from key
-    splits = order_key(key, lang)
-    key_length = len(splits)
 
-    if verbose:
-        print("\nKey Length: ")
-        print(key_length)
+def clear_plan_cache() -> None:
+    """
+    Removes all compiled plans from the plan cache and resets its counters
+    """
+    get_luigi_sacco_plan.cache_clear()
+
+
+def get_luigi_sacco_matrices(splits: List[int], plain_text: str) -> Tuple[List[List[str]], List[List[str]], List[List[str]]]:
+    """
+    Returns the initial matrix, its transposed form and the final message
+    matrix of the Luigi Sacco method for given (already formatted) plain text.
+    These are only needed to show intermediate steps.
+    """
+    key_length = len(splits)
 
     # NOTES
     #   A Row will NEVER be longer than the length of the key by definition of this encryption method
@@ -262,39 +306,20 @@ def luigi_sacco_encrypt(key: str, plain_text: str, lang: Literal["EN", "TR"] = "
     # This is the matrix that you will see under the 'luigi sacco' section in the teacher's notes
     initial_matrix = []
 
-    while len(plain_text) > 0:
-
-        for split in splits:
+    current_index = 0
 
-            new_row = []
+    while current_index < len(plain_text):
 
-            while split != 0 and len(plain_text) > 0:
-                new_row.append(plain_text[0])
-                plain_text = plain_text[1:]
-                split -= 1
+        for split in splits:
 
+            new_row = list(plain_text[current_index:current_index + split])
+            current_index += len(new_row)
 
             filler = ['_' for i in range(key_length - len(new_row))]
             initial_matrix.append(new_row + filler)
 
-    # fill up 'empty spaces' in message matrix to be able to get the final form
-    max_row_length = len(max(initial_matrix, key=len))
-
-    for row in initial_matrix:
-        while len(row) < max_row_length:
-            row.append('_')
-
-    if verbose:
-        print("\nInitial Matrix")
-        [print(row) for row in initial_matrix]
-
     # Transposing to make extracting final message easier
-    transposed_matrix = get_transposed(initial_matrix)
-
-    if verbose:
-        print("\nTransposed Matrix")
-        [print(row) for row in transposed_matrix]
-
+    transposed_matrix = get_transposed(initial_matrix) if initial_matrix else []
 
     final_message_matrix = []
 
@@ -303,77 +328,211 @@ def luigi_sacco_encrypt(key: str, plain_text: str, lang: Literal["EN", "TR"] = "
         if row_index <= len(transposed_matrix):
             final_message_matrix.append(transposed_matrix[row_index - 1])
 
+    return initial_matrix, transposed_matrix, final_message_matrix
+
+
+### ENCRYPT
+def luigi_sacco_encrypt(key: str, plain_text: str, lang: str = "TR", verbose: bool=False, with_spaces: bool = False, normalized: bool = False) -> str:
+    """
+    Encrypts given plain text message using given key.
+
+    Pass normalized=True if key and plain text have already gone through
+    normalize_text to skip normalizing and validating them again. Pass
+    verbose=True to print every stage and intermediate matrix (see
+    logic/tracing.py).
+    """
     if verbose:
-        print(splits)
-        print("\nFinal Message Matrix")
-        [print(row) for row in final_message_matrix]
+        with tracing.using_sink(tracing.PrintingSink()):
+            return luigi_sacco_encrypt(key, plain_text, lang, with_spaces=with_spaces, normalized=normalized)
+
+    if not normalized:
+        with tracing.span("normalize", len(plain_text)):
+            key, plain_text = normalize_key_and_input_text(key, plain_text, lang)
+
+    if tracing.wants_snapshots():
+        matrices = get_luigi_sacco_matrices(order_key(key, lang), plain_text)
+
+        tracing.snapshot("Initial Matrix", lambda: matrices[0])
+        tracing.snapshot("Transposed Matrix", lambda: matrices[1])
+        tracing.snapshot("Final Message Matrix", lambda: matrices[2])
 
-    # Removing underscores and joining message together
-    final_message = ' '.join([''.join(row).replace('_', '') for row in final_message_matrix])
+    if len(plain_text) <= PLAN_CACHE_MAX_LENGTH:
+        with tracing.span("layout", len(plain_text)):
+            plan = get_luigi_sacco_plan(key, lang, len(plain_text))
 
-    if not with_spaces:
-        final_message = final_message.replace(' ', '')
+        with tracing.span("transpose", len(plain_text)):
+            return plan.encrypt(plain_text, with_spaces=with_spaces)
 
-    return final_message
+    with tracing.span("key-schedule", len(key)):
+        splits = order_key(key, lang)
+
+    with tracing.span("transpose", len(plain_text)):
+        encrypted_letters = [''] * len(plain_text)
+        transpose_with_splits(splits, plain_text, encrypted_letters)
+
+    with tracing.span("join", len(plain_text)):
+        encrypted_text = ''.join(encrypted_letters)
+
+    if with_spaces:
+        with tracing.span("redistribute", len(plain_text)):
+            column_lengths = get_column_lengths(splits, len(plain_text))
+            return add_spaces(encrypted_text, [column_lengths[split - 1] for split in splits])
+
+    return encrypted_text
 
 
 ### DECRYPT
-def luigi_sacco_decrypt(key: str, encrypted_text: str, lang: Literal["EN", "TR"] = "TR", verbose: bool = False) -> str:
+def luigi_sacco_decrypt(key: str, encrypted_text: str, lang: str = "TR", verbose: bool = False, normalized: bool = False) -> str:
     """
     Decrypts given encrypted message using given key.
+
+    Pass normalized=True if key and encrypted text have already gone through
+    normalize_text to skip normalizing and validating them again. Pass
+    verbose=True to print every stage and intermediate step (see
+    logic/tracing.py).
+    """
+    if verbose:
+        with tracing.using_sink(tracing.PrintingSink()):
+            return luigi_sacco_decrypt(key, encrypted_text, lang, normalized=normalized)
+
+    if not normalized:
+        with tracing.span("normalize", len(encrypted_text)):
+            key, encrypted_text = normalize_key_and_input_text(key, encrypted_text, lang)
+
+    tracing.snapshot("Key Splits", lambda: order_key(key, lang))
+    tracing.snapshot("Column Lengths", lambda: get_column_lengths(order_key(key, lang), len(encrypted_text)))
+    tracing.snapshot("Encrypted Words", lambda: get_split_encrypted_text(key, encrypted_text, lang))
+
+    if len(encrypted_text) <= PLAN_CACHE_MAX_LENGTH:
+        with tracing.span("layout", len(encrypted_text)):
+            plan = get_luigi_sacco_plan(key, lang, len(encrypted_text))
+
+        with tracing.span("transpose", len(encrypted_text)):
+            return plan.decrypt(encrypted_text)
+
+    with tracing.span("key-schedule", len(key)):
+        splits = order_key(key, lang)
+
+    with tracing.span("transpose", len(encrypted_text)):
+        plain_letters = [''] * len(encrypted_text)
+        transpose_with_splits(splits, encrypted_text, plain_letters, reverse=True)
+
+    with tracing.span("join", len(encrypted_text)):
+        return ''.join(plain_letters)
+
+
+### BUFFERS
+def _transpose_buffer(key: str, buffer: Buffer, lang: str, reverse: bool) -> bytearray:
+    """
+    Encrypts (or decrypts when reverse is True) given buffer of alphabet indices
     """
-    key, encrypted_text = format_key_and_input_text(key, encrypted_text)
-    
-    confirm_text_in_correct_lang(key, lang)
-    confirm_text_in_correct_lang(encrypted_text, lang)
+    key = normalize_text(key, lang, "key")
 
-    # Start of decryption #
+    source = memoryview(buffer).cast('B')
 
-    splits = order_key(key, lang)
+    if len(source) <= PLAN_CACHE_MAX_LENGTH:
+        plan = get_luigi_sacco_plan(key, lang, len(source))
+        return bytearray(map(source.__getitem__, plan.inverse if reverse else plan.permutation))
 
-    if verbose:
-        print(splits)
+    destination = bytearray(len(source))
 
-    encrypted_text = get_split_encrypted_text(key, encrypted_text, lang)
+    transpose_with_splits(order_key(key, lang), source, destination, reverse=reverse)
 
-    # Create empty matrix
-    transposed_matrix = [[] for _ in range(len(splits))]
+    return destination
 
-    # Fill 'er up
-    for word, split in zip(encrypted_text, splits):
-        # Split word in character list and assign to relevant column
-        transposed_matrix[split - 1] = [char for char in word]
 
+def luigi_sacco_encrypt_buffer(key: str, buffer: Buffer, lang: str = "TR") -> bytearray:
+    """
+    Encrypts given buffer of alphabet indices (see logic/encoding.py) using
+    given key, and returns the encrypted message as a buffer of alphabet
+    indices as well.
+    """
+    return _transpose_buffer(key, buffer, lang, reverse=False)
 
-    # Filling in empty spaces with '_' to transpose matrix (because function has
-    # trouble with 'jagged' matrices)
-    max_row_length = len(max(transposed_matrix, key=len))
 
-    for row in transposed_matrix:
-        while len(row) < max_row_length:
-            row.append('_')
+def luigi_sacco_decrypt_buffer(key: str, buffer: Buffer, lang: str = "TR") -> bytearray:
+    """
+    Decrypts given buffer of alphabet indices using given key, and returns the
+    decrypted message as a buffer of alphabet indices as well.
+    """
+    return _transpose_buffer(key, buffer, lang, reverse=True)
 
-    if verbose:
-        print("\nTransposed Matrix")
-        [print(row) for row in transposed_matrix]
 
-    # This has the same shape as the initial matrix in the encrypting function
-    # but the positions of the letters are not correct yet
-    initial_matrix = get_transposed(transposed_matrix)
+### BATCH
+def _get_batch_permutation(key: str, messages, lang: str, inverse: bool):
+    """
+    Validates a batch of alphabet-encoded messages (same length rows of
+    indices within the alphabet of given language) and returns it as an array
+    together with the column permutation to gather it with
+    """
+    try:
+        import numpy as np
 
-    if verbose:
-        print("\n")
-        [print(row) for row in initial_matrix]
+    except ImportError as e:
+        raise ImportError("Batch encryption / decryption requires numpy to be installed") from e
+
+    key = normalize_text(key, lang, "key")
+
+    try:
+        messages = np.asarray(messages)
+
+    except ValueError:
+        raise ValueError("Messages of a batch must all have the same length") from None
+
+    if messages.dtype == object:
+        raise ValueError("Messages of a batch must all have the same length")
+
+    if messages.ndim != 2:
+        raise ValueError(f"Expected an (N, L) array of messages, got an array with shape {messages.shape}")
+
+    if messages.dtype.kind not in "iu":
+        raise ValueError(f"Expected alphabet indices as integers, got an array of {messages.dtype}")
+
+    alphabet_size = len(get_alphabet(lang).letters)
+
+    if messages.size > 0 and (messages.min() < 0 or messages.max() >= alphabet_size):
+        raise ValueError(f"Messages have indices outside of the alphabet of '{lang}' (0 to {alphabet_size - 1})")
+
+    message_length = messages.shape[1]
+
+    if message_length <= PLAN_CACHE_MAX_LENGTH:
+        plan = get_luigi_sacco_plan(key, lang, message_length)
+
+        return messages, np.asarray(plan.inverse if inverse else plan.permutation, dtype=np.intp)
+
+    # Long rows skip the plan cache, and only need one of the two directions
+    permutation = np.empty(message_length, dtype=np.intp)
+    transpose_with_splits(order_key(key, lang), range(message_length), permutation, reverse=inverse)
+
+    return messages, permutation
 
-    # This final step places the letters in their correct positions
-    final_matrix = distribute_letters_across_matrix(initial_matrix, splits, verbose)
 
-    decrypted_message = ''.join([''.join(row).replace('_', '') for row in final_matrix])
+def luigi_sacco_encrypt_batch(key: str, messages, lang: str = "TR"):
+    """
+    Encrypts a batch of same-length messages using given key.
+
+    Messages are given as an (N, L) numpy array (or anything convertible to
+    one) where each row holds the alphabet indices of one message. The whole
+    batch is encrypted with a single gather and returned as an (N, L) array.
+    """
+    messages, permutation = _get_batch_permutation(key, messages, lang, inverse=False)
+
+    return messages[:, permutation]
+
+
+def luigi_sacco_decrypt_batch(key: str, messages, lang: str = "TR"):
+    """
+    Decrypts a batch of same-length encrypted messages using given key.
+
+    Counterpart of luigi_sacco_encrypt_batch, takes and returns an (N, L)
+    array of alphabet indices.
+    """
+    messages, permutation = _get_batch_permutation(key, messages, lang, inverse=True)
 
-    return decrypted_message
+    return messages[:, permutation]
 
 
-def test_program(key: str, plain_text: str, lang: Literal["EN", "TR"] = "TR", verbose=False) -> bool:
+def test_program(key: str, plain_text: str, lang: str = "TR", verbose=False) -> bool:
     """
 
     """
@@ -384,8 +543,7 @@ def test_program(key: str, plain_text: str, lang: Literal["EN", "TR"] = "TR", ve
     # both work correctly
     decrypted_message = luigi_sacco_decrypt(key, encrypted_message, lang=lang, verbose=False)
 
-    correctly_encrypted_and_decrypted = \
-        decrypted_message.replace(' ', '').upper() == plain_text.replace(' ', '').upper()
+    correctly_encrypted_and_decrypted = decrypted_message == normalize_text(plain_text, lang)
 
     if verbose:
         print(f"\n\n\nOriginal Message:")
@@ -516,8 +674,125 @@ def execute_turkish_tests():
         """)
 
 
+def execute_batch_tests() -> None:
+    """
+    Checks the batch functions give the same output as luigi_sacco_encrypt,
+    and reject invalid batches. Skipped if numpy is not installed.
+    """
+    try:
+        import numpy as np
+
+    except ImportError:
+        print("Skipping batch tests, numpy is not installed")
+        return
+
+    from .encoding import decode_text, encode_text
+
+    cases = [
+        ("HELLOWORLD", ["WHATAWONDERFULWORLDWELIVEINTODAY", "NOWHEREISANORMALMESSAGEOFLENGTHX"], "EN"),
+        ("TERAZİ", ["ADALETMÜLKÜNTEMELİDİR", "MÜLKÜNTEMELİADALETTİR"], "TR"),
+        # Longer than PLAN_CACHE_MAX_LENGTH, so the plan cache is skipped
+        ("HELLOWORLD", [("WHATAWONDERFULWORLDWELIVEIN" * 200)[:5000], ("NOWHEREISANORMALMESSAGE" * 300)[:5000]], "EN"),
+    ]
+
+    total = 0
+    total_correct = 0
+
+    for key, messages, lang in cases:
+        batch = np.array([np.frombuffer(encode_text(message, lang), dtype=np.uint8) for message in messages])
+
+        cached_plan_count = get_plan_cache_info().currsize
+
+        encrypted_batch = luigi_sacco_encrypt_batch(key, batch, lang)
+
+        total += 1
+
+        if batch.shape[1] > PLAN_CACHE_MAX_LENGTH and get_plan_cache_info().currsize != cached_plan_count:
+            continue
+
+        if [decode_text(row.tobytes(), lang) for row in encrypted_batch] == [luigi_sacco_encrypt(key, message, lang) for message in messages] and \
+                np.array_equal(luigi_sacco_decrypt_batch(key, encrypted_batch, lang), batch):
+            total_correct += 1
+
+    invalid_batches = [
+        [[0, 1, 2], [3, 4]],
+        [[0, 1, 2], [3, 4, 26]],
+        [[0, 1, -1]],
+        [[0.5, 1, 2]],
+        [0, 1, 2],
+    ]
+
+    for batch in invalid_batches:
+        total += 1
+
+        try:
+            luigi_sacco_encrypt_batch("KEY", batch, "EN")
+
+        except ValueError:
+            total_correct += 1
+
+    print(f"Got {total_correct} correct out of {total}")
+
+
+def execute_alphabet_tests() -> None:
+    """
+    Checks registering an alphabet again doesn't leave plans of the old one in
+    the plan cache
+    """
+    from .alphabets import ALPHABETS, register_alphabet
+
+    message = "HELLOWORLD"
+
+    register_alphabet("XX", "ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+
+    try:
+        luigi_sacco_encrypt("KEY", message, "XX")
+
+        # Same letters, ordered backwards, which reverses the order of the key
+        register_alphabet("XX", "ZYXWVUTSRQPONMLKJIHGFEDCBA")
+
+        is_correct = luigi_sacco_encrypt("KEY", message, "XX") == encrypt_with_splits(order_key("KEY", "XX"), message)
+
+    finally:
+        del ALPHABETS["XX"]
+
+    print(f"Got {int(is_correct)} correct out of 1")
+
+
+def execute_decryption_benchmark() -> None:
+    """
+    Times decryption of increasingly long messages to show how its runtime
+    scales with the length of the message.
+    """
+    key = "THISISAVERYLONGKEYINDEED"
+    phrase = "WHATAWONDERFULWORLDWELIVEIN"
+
+    print(f"{'Length':>10} {'Seconds':>10} {'us / char':>10}")
+
+    for message_length in [10**3, 10**4, 10**5, 10**6, 4 * 10**6]:
+        message = (phrase * (message_length // len(phrase) + 1))[:message_length]
+
+        encrypted_message = luigi_sacco_encrypt(key, message, lang="EN")
+
+        start = time.perf_counter()
+        decrypted_message = luigi_sacco_decrypt(key, encrypted_message, lang="EN")
+        elapsed = time.perf_counter() - start
+
+        assert decrypted_message == message
+
+        print(f"{message_length:>10} {elapsed:>10.4f} {elapsed / message_length * 10**6:>10.3f}")
+
+
 if __name__ == '__main__':
 
-    execute_english_tests()
+    if "--benchmark" in sys.argv:
+        execute_decryption_benchmark()
+
+    else:
+        execute_english_tests()
+
+        execute_turkish_tests()
+
+        execute_batch_tests()
 
-    execute_turkish_tests()
+        execute_alphabet_tests()
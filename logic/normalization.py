@@ -0,0 +1,112 @@
+from typing import Tuple
+
+from .alphabets import get_alphabet
+
+
+class InvalidCharacterError(ValueError):
+    """
+    Raised when a text has a character that doesn't belong to a language.
+    Position is the index of the first such character in the text as given.
+    """
+
+    def __init__(self, text_type: str, lang: str, character: str, position: int) -> None:
+        super().__init__(
+            f"Given {text_type} does not seem to belong to the group '{lang}' "
+            f"(found '{character}' at position {position})")
+
+        self.text_type = text_type
+        self.lang = lang
+        self.character = character
+        self.position = position
+
+
+def normalize_text(text: str, lang: str, text_type: str = "text") -> str:
+    """
+    Returns given text upper cased according to given language and stripped of
+    all white space. Raises InvalidCharacterError if anything is left that is
+    not a letter of that language.
+    """
+    alphabet = get_alphabet(lang)
+
+    table, pattern = alphabet.normalization_table, alphabet.invalid_character_pattern
+
+    normalized_text = text.translate(table)
+
+    if pattern.search(normalized_text) is not None:
+        # Only on failure: walk the text as given to report where the character is
+        for position, char in enumerate(text):
+            if pattern.match(char.translate(table)):
+                raise InvalidCharacterError(text_type, lang, char, position)
+
+    return normalized_text
+
+
+def normalize_key_and_input_text(key: str, input_text: str, lang: str) -> Tuple[str, str]:
+    """
+    Returns a tuple of given key and input text, both normalized for given
+    language
+    """
+    return normalize_text(key, lang, "key"), normalize_text(input_text, lang)
+
+
+def execute_tests() -> None:
+    """
+    Checks language specific upper casing of every registered table, and that
+    invalid characters are reported with their position in the text as given
+    """
+    cases = [
+        ("ıi Iİ", "TR", "IİIİ"),
+        ("istanbul ılık", "TR", "İSTANBULILIK"),
+        ("hello\tworld\n", "EN", "HELLOWORLD"),
+        ("Straße über Öl", "DE", "STRAßEÜBERÖL"),
+        ("ənənə ılıq iş", "AZ", "ƏNƏNƏILIQİŞ"),
+        ("", "EN", ""),
+    ]
+
+    invalid_cases = [
+        ("hello world!", "EN", "text", "!", 11),
+        ("ab  çd", "EN", "key", "ç", 4),
+        ("merhaba q", "TR", "text", "q", 8),
+        ("straße ə", "DE", "text", "ə", 7),
+    ]
+
+    total = 0
+    total_correct = 0
+
+    faulty_tests = []
+
+    for text, lang, expected in cases:
+        total += 1
+
+        if normalize_text(text, lang) == expected:
+            total_correct += 1
+
+        else:
+            faulty_tests.append((text, lang, normalize_text(text, lang)))
+
+    for text, lang, text_type, character, position in invalid_cases:
+        total += 1
+
+        try:
+            normalize_text(text, lang, text_type)
+
+        except InvalidCharacterError as e:
+            if (e.text_type, e.lang, e.character, e.position) == (text_type, lang, character, position):
+                total_correct += 1
+                continue
+
+            faulty_tests.append((text, lang, e.text_type, e.character, e.position))
+
+        else:
+            faulty_tests.append((text, lang, "no error"))
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+if __name__ == '__main__':
+
+    execute_tests()
@@ -0,0 +1,209 @@
+from functools import lru_cache
+from operator import itemgetter
+from typing import NamedTuple, Optional, Sequence, Tuple, Union
+
+from .alphabets import register_alphabet_cache
+from .key_schedule import order_key
+from .luigi_sacco import LuigiSaccoPlan
+from .normalization import normalize_text
+from .route_encryption import get_potential_table_sizes
+from .routes import Permutation, RouteCipher
+
+
+# NOTE
+#   Both ciphers are pure transpositions once the length of the message is
+#   known, so a chain of them is a transposition too. A CipherPipeline
+#   composes the permutation of every stage into a single one (and its
+#   inverse) per message length, and encrypting or decrypting through the
+#   whole chain is then a single gather with no intermediate strings.
+#
+#   Luigi Sacco normalizes its input (upper case, no white space) and route
+#   encryption doesn't. A pipeline with a Luigi Sacco stage normalizes the
+#   input once, up front, in the language of its first Luigi Sacco stage, and
+#   every stage works on that. This gives exactly what running the stages one
+#   after another gives when Luigi Sacco comes first. If a route stage comes
+#   first, spaces are dropped before it instead of after it.
+
+# Maximum number of compiled chains kept around by get_compiled_pipeline
+PIPELINE_CACHE_SIZE = 64
+
+
+class LuigiSaccoStage(NamedTuple):
+    key: str
+    lang: str = "TR"
+
+    def get_permutation(self, message_length: int) -> Permutation:
+        splits = order_key(normalize_text(self.key, self.lang, "key"), self.lang)
+
+        return Permutation(LuigiSaccoPlan(splits, message_length).permutation)
+
+
+class RouteStage(NamedTuple):
+    # Optimal size for the length of the message when not given
+    table_size: Optional[Tuple[int, int]] = None
+    write_route: str = "E4"
+    read_route: str = "B3"
+
+    def get_permutation(self, message_length: int) -> Permutation:
+        table_size = self.table_size
+
+        if table_size is None:
+            _, table_size = get_potential_table_sizes(message_length)
+
+        if table_size[0] * table_size[1] != message_length:
+            raise ValueError(
+                f"Message of length {message_length} does not fit a {table_size[0]} x {table_size[1]} table")
+
+        return RouteCipher(self.write_route, self.read_route, tuple(table_size)).permutation
+
+
+Stage = Union[LuigiSaccoStage, RouteStage]
+
+
+class CompiledPipeline:
+    """
+    Permutation of a whole chain of stages for one message length, and its
+    inverse
+    """
+
+    def __init__(self, permutation: Permutation) -> None:
+        self.permutation = permutation
+        self.inverse = permutation.inverse()
+
+        # itemgetter gathers in C, which is a few times faster than a list
+        # comprehension on long messages. It returns a bare item (instead of a
+        # tuple) when given a single index, and needs at least one.
+        if len(permutation) > 1:
+            self._gather_permutation = itemgetter(*self.permutation.indices)
+            self._gather_inverse = itemgetter(*self.inverse.indices)
+        else:
+            self._gather_permutation = self._gather_inverse = lambda text: text
+
+    def encrypt(self, message: str) -> str:
+        if len(message) != len(self.permutation):
+            raise ValueError(
+                f"Pipeline was compiled for messages of length {len(self.permutation)}, got {len(message)}")
+
+        return ''.join(self._gather_permutation(message))
+
+    def decrypt(self, encrypted_text: str) -> str:
+        if len(encrypted_text) != len(self.permutation):
+            raise ValueError(
+                f"Pipeline was compiled for messages of length {len(self.permutation)}, got {len(encrypted_text)}")
+
+        return ''.join(self._gather_inverse(encrypted_text))
+
+
+@register_alphabet_cache
+@lru_cache(maxsize=PIPELINE_CACHE_SIZE)
+def get_compiled_pipeline(stages: Tuple[Stage, ...], message_length: int) -> CompiledPipeline:
+    """
+    Returns the compiled form of given stages run one after another on a
+    message of given length. Compiled chains are kept in a bounded LRU cache.
+    """
+    permutation = Permutation(range(message_length))
+
+    for stage in stages:
+        permutation = permutation.then(stage.get_permutation(message_length))
+
+    return CompiledPipeline(permutation)
+
+
+class CipherPipeline:
+    """
+    Chain of Luigi Sacco and route encryption stages, run as one permutation
+    """
+
+    def __init__(self, stages: Sequence[Stage]) -> None:
+        if len(stages) == 0:
+            raise ValueError("Pipeline needs at least one stage")
+
+        self.stages: Tuple[Stage, ...] = tuple(
+            RouteStage(tuple(stage.table_size), stage.write_route, stage.read_route)
+            if isinstance(stage, RouteStage) and stage.table_size is not None else stage
+            for stage in stages
+        )
+
+        self.lang = next((stage.lang for stage in self.stages if isinstance(stage, LuigiSaccoStage)), None)
+
+    def __repr__(self) -> str:
+        return f"CipherPipeline({list(self.stages)!r})"
+
+    def _normalize(self, text: str) -> str:
+        return normalize_text(text, self.lang) if self.lang is not None else text
+
+    def encrypt(self, message: str) -> str:
+        """
+        Runs given message through every stage in order
+        """
+        message = self._normalize(message)
+
+        if not message:
+            return message
+
+        return get_compiled_pipeline(self.stages, len(message)).encrypt(message)
+
+    def decrypt(self, encrypted_text: str) -> str:
+        """
+        Undoes every stage, last one first
+        """
+        encrypted_text = self._normalize(encrypted_text)
+
+        if not encrypted_text:
+            return encrypted_text
+
+        return get_compiled_pipeline(self.stages, len(encrypted_text)).decrypt(encrypted_text)
+
+
+def execute_tests() -> None:
+    """
+    Checks pipelines give the same output as running their stages one by one,
+    and round-trip
+    """
+    from .luigi_sacco import luigi_sacco_decrypt, luigi_sacco_encrypt
+    from .route_encryption import route_decrypt, route_encrypt
+
+    messages = [
+        "Here is a normal message",
+        "Now here is a very long message that is quite cumbersome to write",
+        "short",
+    ]
+
+    total = 0
+    total_correct = 0
+
+    for message in messages:
+        formatted_message = normalize_text(message, "EN")
+
+        sizes, optimal_size = get_potential_table_sizes(len(formatted_message))
+
+        # Luigi Sacco, then route encryption
+        pipeline = CipherPipeline([LuigiSaccoStage("helloworld", "EN"), RouteStage(optimal_size)])
+
+        expected = route_encrypt(luigi_sacco_encrypt("helloworld", message, "EN"), optimal_size)
+
+        total += 1
+
+        if pipeline.encrypt(message) == expected and \
+                luigi_sacco_decrypt("helloworld", route_decrypt(expected, optimal_size), "EN") == pipeline.decrypt(expected):
+            total_correct += 1
+
+        # Longer chains, including other routes
+        pipeline = CipherPipeline([
+            LuigiSaccoStage("helloworld", "EN"),
+            RouteStage(sizes[-1]),
+            LuigiSaccoStage("key", "EN"),
+            RouteStage(write_route="spiral", read_route="snake_columns"),
+        ])
+
+        total += 1
+
+        if pipeline.decrypt(pipeline.encrypt(message)) == formatted_message:
+            total_correct += 1
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+
+if __name__ == '__main__':
+
+    execute_tests()
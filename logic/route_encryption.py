@@ -1,43 +1,231 @@
 
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Dict, Iterator, List, MutableSequence, Sequence, Tuple
 
+import math
 
-def get_divisors(number: int) -> List[int]:
+from . import tracing
+from .encoding import Buffer
+
+
+# Maximum number of compiled plans kept around by get_route_plan
+PLAN_CACHE_SIZE = 256
+
+# Tables bigger than this skip the plan cache, since a compiled plan holds two
+# integer lists as long as the message itself
+PLAN_CACHE_MAX_LENGTH = 4096
+
+
+# Number of row counts (below the square root of the length) tried when looking
+# for padded table sizes
+MAX_PADDED_ROW_COUNTS = 4096
+
+# Bases for which Miller-Rabin is deterministic for every number below 3.3 * 10^24
+MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+# factorize trial divides up to this, and splits what is left with Pollard's rho
+TRIAL_DIVISION_LIMIT = 1000
+
+
+def is_prime(number: int) -> bool:
     """
-    Returns all positive integers that divide given number without remainder
-    (including the number itself)
+    Returns whether given number is prime, using deterministic Miller-Rabin
     """
-    return [divisor for divisor in range(1, number+1) if number % divisor == 0]
+    if number < 2:
+        return False
 
+    for base in MILLER_RABIN_BASES:
+        if number % base == 0:
+            return number == base
 
-def get_potential_table_sizes(message_length: int, verbose: bool = False) -> Tuple[List[Tuple[int, int]], Tuple[int, int]]:
+    # Write number - 1 as d * 2^s with d odd
+    d, s = number - 1, 0
+
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+
+    for base in MILLER_RABIN_BASES:
+        x = pow(base, d, number)
+
+        if x == 1 or x == number - 1:
+            continue
+
+        for _ in range(s - 1):
+            x = pow(x, 2, number)
+
+            if x == number - 1:
+                break
+
+        else:
+            return False
+
+    return True
+
+
+def pollard_rho(number: int) -> int:
     """
-    Returns a Tuple where the first element is a list of all potential sizes for
-    the given message length and the second element is the optimal size
+    Returns a non-trivial divisor of given odd composite number, using Brent's
+    variant of Pollard's rho. Tries increasing constants (so results don't
+    depend on chance) until one of them finds a divisor.
     """
+    for constant in range(1, number):
+        x = y = 2
+        divisor = 1
+        power = cycle_length = 1
 
-    if verbose:
-        print(f"Got message with size = {message_length}")
+        while divisor == 1:
+            # Brent: move y ahead in doubling steps, comparing against x
+            if power == cycle_length:
+                x = y
+                power *= 2
+                cycle_length = 0
 
+            y = (y * y + constant) % number
+            cycle_length += 1
+
+            divisor = math.gcd(abs(x - y), number)
+
+        if divisor != number:
+            return divisor
+
+    raise ValueError(f"Could not find a divisor of {number}")
+
+
+def factorize(number: int) -> Dict[int, int]:
+    """
+    Returns the prime factors of given positive number mapped to their powers.
+
+    Trial divides by 2, 3 and then numbers of the form 6k +/- 1 up to
+    TRIAL_DIVISION_LIMIT. Whatever is left is split with Pollard's rho until
+    every part is prime, which is checked with Miller-Rabin.
+    """
+    factors: Dict[int, int] = {}
+
+    for prime in (2, 3):
+        while number % prime == 0:
+            factors[prime] = factors.get(prime, 0) + 1
+            number //= prime
+
+    candidate = 5
+
+    while candidate <= TRIAL_DIVISION_LIMIT and candidate * candidate <= number:
+        for divisor in (candidate, candidate + 2):
+            while number % divisor == 0:
+                factors[divisor] = factors.get(divisor, 0) + 1
+                number //= divisor
+
+        candidate += 6
+
+    remaining = [number] if number > 1 else []
+
+    while remaining:
+        number = remaining.pop()
+
+        if is_prime(number):
+            factors[number] = factors.get(number, 0) + 1
+
+        else:
+            divisor = pollard_rho(number)
+            remaining += [divisor, number // divisor]
+
+    return factors
+
+
+def get_divisors(number: int) -> List[int]:
+    """
+    Returns all positive integers that divide given number without remainder
+    (including the number itself), built from its prime factors
+    """
+    if number < 1:
+        return []
+
+    divisors = [1]
+
+    for prime, power in factorize(number).items():
+        divisors = [divisor * prime ** exponent for divisor in divisors for exponent in range(power + 1)]
+
+    return sorted(divisors)
+
+
+@lru_cache(maxsize=1024)
+def _get_potential_table_sizes(message_length: int) -> Tuple[Tuple[Tuple[int, int], ...], Tuple[int, int]]:
+    """
+    Cached part of get_potential_table_sizes
+    """
     # Need to get all divisors of the given message length
     divisors = get_divisors(message_length)
     reverse_divisors = divisors[::-1]
 
-    potential_table_sizes = [(i, j)
-                             for i, j in zip(divisors, reverse_divisors)]
-
-    if verbose:
-        print("\nPotential Sizes for Table:")
-        for i, j in potential_table_sizes:
-            print(f"{i} x {j}")
+    potential_table_sizes = tuple((i, j) for i, j in zip(divisors, reverse_divisors))
 
     # Optimal size is when the difference between row counts and column counts is minimized
     optimal_size = min(potential_table_sizes, key=lambda x: abs(x[0]-x[1]))
 
+    return potential_table_sizes, optimal_size
+
+
+def get_potential_table_sizes(message_length: int, verbose: bool = False) -> Tuple[List[Tuple[int, int]], Tuple[int, int]]:
+    """
+    Returns a Tuple where the first element is a list of all potential sizes for
+    the given message length and the second element is the optimal size.
+
+    Results are cached per message length. Pass verbose=True to print them.
+    """
     if verbose:
-        print(f"\nOptimal Size = {optimal_size}")
+        with tracing.using_sink(tracing.PrintingSink()):
+            return get_potential_table_sizes(message_length)
+
+    with tracing.span("layout", message_length):
+        potential_table_sizes, optimal_size = _get_potential_table_sizes(message_length)
+
+    tracing.snapshot("Potential Sizes for Table", lambda: [f"{i} x {j}" for i, j in potential_table_sizes])
+    tracing.snapshot("Optimal Size", lambda: optimal_size)
+
+    return list(potential_table_sizes), optimal_size
 
-    return potential_table_sizes, optimal_size
+
+@lru_cache(maxsize=1024)
+def get_padded_table_sizes(message_length: int, count: int = 5, max_aspect_ratio: float = 2.0) -> Tuple[Tuple[Tuple[int, int], int], ...]:
+    """
+    Returns near-square table sizes a message of given length fits in once it
+    is padded, as (table size, number of padding characters) pairs ranked by
+    padding and then by how square the table is. Results are cached, so they
+    are returned as a tuple which callers can't change.
+
+    Meant for prime or otherwise awkward lengths, whose only exact table sizes
+    are long and thin. Only tables whose longer side is at most
+    max_aspect_ratio times their shorter side, and whose row count is among the
+    MAX_PADDED_ROW_COUNTS closest to the square root, are considered.
+    """
+    if message_length < 1:
+        return ()
+
+    candidates = []
+
+    highest_row_count = math.isqrt(message_length) + 1
+    lowest_row_count = max(1, math.isqrt(int(message_length / max_aspect_ratio)),
+                           highest_row_count - MAX_PADDED_ROW_COUNTS)
+
+    for row_count in range(lowest_row_count, highest_row_count + 1):
+        col_count = -(-message_length // row_count)
+
+        if col_count < row_count or col_count > row_count * max_aspect_ratio:
+            continue
+
+        padding = row_count * col_count - message_length
+
+        candidates.append((padding, col_count - row_count, (row_count, col_count)))
+
+    return tuple((table_size, padding) for padding, _, table_size in sorted(candidates)[:count])
+
+
+def pad_message(message: str, table_size: Tuple[int, int], filler: str = 'X') -> str:
+    """
+    Returns given message padded with filler characters to fill a table of
+    given size
+    """
+    return message + filler * (table_size[0] * table_size[1] - len(message))
 
 
 def create_empty_matrix(table_size: Tuple[int, int], verbose: bool = False) -> List[List[str]]:
@@ -58,18 +246,32 @@ def get_matrix_diags(matrix: List[List[str]]) -> List[Tuple[int, int]]:
     """
     row_count, col_count = len(matrix), len(matrix[0])
 
-    diags = []
-    # Every element in the last column is the start of a diagonal
-    # List is reversed to keep order of diagonals
-    for i in list(range(row_count))[::-1]:
-        diags.append((i, col_count-1))
+    # Every element in the last column is the start of a diagonal, followed by
+    # every other element in the first row. Both are listed from the bottom /
+    # right to keep order of diagonals.
+    return [(i, col_count-1) for i in range(row_count-1, -1, -1)] + \
+           [(0, j) for j in range(col_count-2, -1, -1)]
 
-    # Every element in the first row is also the start of a diagonal
-    for j in list(range(col_count))[::-1]:
-        if (0, j) not in diags:
-            diags.append((0, j))
 
-    return diags
+def iter_e4_indices(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Yields the flat (row-major) index of every cell of a table with given size,
+    in the order the E4 route visits them. Works from the table size alone:
+    moving one cell down-left along a diagonal is a step of col_count - 1 in
+    the flat index, so every diagonal is a single range.
+    """
+    row_count, col_count = table_size
+
+    # Diagonals of a single column table are single cells, so any step will do
+    step = max(col_count - 1, 1)
+
+    for diag in range(row_count + col_count - 2, -1, -1):
+        first_row = max(0, diag - col_count + 1)
+        last_row = min(row_count - 1, diag)
+
+        start = first_row * col_count + (diag - first_row)
+
+        yield from range(start, start + (last_row - first_row + 1) * step, step)
 
 
 def apply_e4(message: str, empty_matrix: List[List[str]]) -> List[List[str]]:
@@ -79,24 +281,13 @@ def apply_e4(message: str, empty_matrix: List[List[str]]) -> List[List[str]]:
     """
     row_count, col_count = len(empty_matrix), len(empty_matrix[0])
 
-    # Copying given matrix
-    matrix = [[element for element in row] for row in empty_matrix]
-
-    # Iterator is used to easily distribute chars of message across matrix
-    message_iterator = iter(message)
-
-    diags = get_matrix_diags(matrix)
-
-    for diag_head in diags:
+    # Filling a flat copy of the matrix, then cutting it into rows
+    cells = [element for row in empty_matrix for element in row]
 
-        i, j = diag_head
+    for cell_index, char in zip(iter_e4_indices((row_count, col_count)), message):
+        cells[cell_index] = char
 
-        while i <= row_count-1 and j >= 0:
-            matrix[i][j] = next(message_iterator)
-            i += 1
-            j -= 1
-
-    return matrix
+    return [cells[row * col_count:(row + 1) * col_count] for row in range(row_count)]
 
 
 def apply_b3(matrix: List[List[str]]) -> str:
@@ -143,60 +334,230 @@ def apply_reverse_e4(matrix: List[List[str]]) -> str:
     """
     row_count, col_count = len(matrix), len(matrix[0])
 
-    message = ""
+    cells = [element for row in matrix for element in row]
+
+    return ''.join([cells[cell_index] for cell_index in iter_e4_indices((row_count, col_count))])
+
+
+def transpose_route(source: Sequence, destination: MutableSequence, table_size: Tuple[int, int], reverse: bool = False) -> None:
+    """
+    Moves every element of source to its place in destination according to E4
+    & B3 routes. Encrypts when reverse is False and decrypts when it is True.
+
+    Every E4 diagonal is a contiguous run of the message, and the same cells are
+    read by B3 with a constant step of -(row_count + 1), so each diagonal is
+    moved with a single extended slice assignment and no matrix is built.
+    """
+    row_count, col_count = table_size
 
-    diags = get_matrix_diags(matrix)
+    if len(source) != row_count * col_count:
+        raise ValueError(
+            f"Message of length {len(source)} does not fit a {row_count} x {col_count} table")
 
-    for diag_head in diags:
+    step = row_count + 1
+    message_index = 0
 
-        i, j = diag_head
+    # Diagonals are visited in the same order as get_matrix_diags returns them
+    for diag in range(row_count + col_count - 2, -1, -1):
+        first_row = max(0, diag - col_count + 1)
+        last_row = min(row_count - 1, diag)
+        diag_length = last_row - first_row + 1
 
-        while i <= row_count-1 and j >= 0:
-            message += matrix[i][j]
-            i += 1
-            j -= 1
+        # B3 reads columns from left to right, each one from bottom to top
+        start = (diag - first_row) * row_count + (row_count - 1 - first_row)
+        stop = start - diag_length * step
 
-    return message
+        b3_slice = slice(start, stop if stop >= 0 else None, -step)
+        e4_slice = slice(message_index, message_index + diag_length)
+
+        if reverse:
+            destination[e4_slice] = source[b3_slice]
+        else:
+            destination[b3_slice] = source[e4_slice]
+
+        message_index += diag_length
+
+
+def get_e4_matrix(encrypted_text: str, table_size: Tuple[int, int]) -> List[List[str]]:
+    """
+    Returns the E4 matrix behind given encrypted message. Since B3 reads every
+    column from bottom to top, each row is a strided slice of the message.
+    """
+    row_count = table_size[0]
+
+    return [list(encrypted_text[row_count - 1 - row::row_count]) for row in range(row_count)]
+
+
+class RoutePlan:
+    """
+    Compiled form of E4 & B3 routes for one table size.
+
+    E4 writing and B3 reading are fused into a single permutation mapping every
+    position of the encrypted message to the position of the message letter it
+    was taken from, and the inverse maps the other way around.
+    """
+
+    def __init__(self, table_size: Tuple[int, int]) -> None:
+        self.table_size = table_size
+
+        row_count, col_count = table_size
+        message_length = row_count * col_count
+
+        # Transposing the positions themselves gives the permutation and its inverse
+        self.permutation: List[int] = [0] * message_length
+        transpose_route(range(message_length), self.permutation, table_size)
+
+        self.inverse: List[int] = [0] * message_length
+        transpose_route(range(message_length), self.inverse, table_size, reverse=True)
+
+    def _confirm_length(self, text: str) -> None:
+        if len(text) != len(self.permutation):
+            raise ValueError(
+                f"Message of length {len(text)} does not fit a {self.table_size[0]} x {self.table_size[1]} table")
+
+    def encrypt(self, message: str) -> str:
+        """
+        Encrypts given message by gathering its letters in the order of the
+        permutation
+        """
+        self._confirm_length(message)
+
+        return ''.join([message[i] for i in self.permutation])
+
+    def decrypt(self, encrypted_text: str) -> str:
+        """
+        Decrypts given encrypted message by gathering its letters in the order of
+        the inverse permutation
+        """
+        self._confirm_length(encrypted_text)
+
+        return ''.join([encrypted_text[i] for i in self.inverse])
+
+    def get_matrix(self, encrypted_text: str) -> List[List[str]]:
+        """
+        Returns the E4 matrix behind given encrypted message
+        """
+        self._confirm_length(encrypted_text)
+
+        return get_e4_matrix(encrypted_text, self.table_size)
+
+
+@lru_cache(maxsize=PLAN_CACHE_SIZE)
+def get_route_plan(table_size: Tuple[int, int]) -> RoutePlan:
+    """
+    Returns the compiled plan for given table size. Plans are kept in a bounded
+    LRU cache so repeated traffic with the same table size skips compiling.
+    """
+    return RoutePlan(tuple(table_size))
+
+
+def get_plan_cache_info():
+    """
+    Returns hits, misses, maximum size and current size of the plan cache
+    """
+    return get_route_plan.cache_info()
+
+
+def clear_plan_cache() -> None:
+    """
+    Removes all compiled plans from the plan cache and resets its counters
+    """
+    get_route_plan.cache_clear()
+
+
+def clear_table_size_cache() -> None:
+    """
+    Removes all cached table sizes and resets their counters
+    """
+    _get_potential_table_sizes.cache_clear()
+    get_padded_table_sizes.cache_clear()
+
+
+def route_encrypt_buffer(buffer: Buffer, table_size: Tuple[int, int]) -> bytearray:
+    """
+    Encrypts given bytes-like buffer (such as encoded text, see
+    logic/encoding.py) across a matrix with given table size according to E4 &
+    B3 methods, and returns the encrypted buffer.
+    """
+    source = memoryview(buffer).cast('B')
+    destination = bytearray(len(source))
+
+    transpose_route(source, destination, table_size)
+
+    return destination
+
+
+def route_decrypt_buffer(buffer: Buffer, table_size: Tuple[int, int]) -> bytearray:
+    """
+    Decrypts given bytes-like buffer according to given table size, and returns
+    the decrypted buffer.
+    """
+    source = memoryview(buffer).cast('B')
+    destination = bytearray(len(source))
+
+    transpose_route(source, destination, table_size, reverse=True)
+
+    return destination
 
 
 def route_encrypt(message: str, table_size: Tuple[int, int], verbose: bool = False) -> str:
     """
     Encrypts given message across a matrix with given table size according to E4 & B3 methods.
+
+    Pass verbose=True to print every stage and the E4 matrix (see
+    logic/tracing.py).
     """
     if verbose:
-        print(f"Creating empty matrix")
+        with tracing.using_sink(tracing.PrintingSink()):
+            return route_encrypt(message, table_size)
 
-    empty_e4_matrix = create_empty_matrix(table_size, verbose=verbose)
+    table_size = tuple(table_size)
 
-    if verbose:
-        print("\n\nEmpty Matrix\n")
-        [print(f"{row}") for row in empty_e4_matrix]
+    tracing.snapshot("E4 Matrix", lambda: apply_e4(message, create_empty_matrix(table_size)))
 
-    populated_e4_matrix = apply_e4(message, empty_e4_matrix)
+    if table_size[0] * table_size[1] <= PLAN_CACHE_MAX_LENGTH:
+        with tracing.span("layout", len(message)):
+            plan = get_route_plan(table_size)
 
-    if verbose:
-        print("\n\nE4 Matrix\n")
-        [print(row) for row in populated_e4_matrix]
+        with tracing.span("transpose", len(message)):
+            return plan.encrypt(message)
 
-    b3_message = apply_b3(populated_e4_matrix)
+    with tracing.span("transpose", len(message)):
+        encrypted_message = [''] * len(message)
+        transpose_route(message, encrypted_message, table_size)
 
-    return b3_message
+    with tracing.span("join", len(message)):
+        return ''.join(encrypted_message)
 
 
 def route_decrypt(input_text: str, table_size: Tuple[int, int], verbose: bool = False) -> str:
     """
     Decrypts given message according to given table size. Follows reverse E4 & B3 routes.
+
+    Pass verbose=True to print every stage and the inferred E4 matrix (see
+    logic/tracing.py).
     """
+    if verbose:
+        with tracing.using_sink(tracing.PrintingSink()):
+            return route_decrypt(input_text, table_size)
 
-    e4_matrix = apply_reverse_b3(input_text, table_size)
+    table_size = tuple(table_size)
 
-    if verbose:
-        print("\n\nInferred E4 Matrix:")
-        [print(row) for row in e4_matrix]
+    tracing.snapshot("Inferred E4 Matrix", lambda: apply_reverse_b3(input_text, table_size))
+
+    if table_size[0] * table_size[1] <= PLAN_CACHE_MAX_LENGTH:
+        with tracing.span("layout", len(input_text)):
+            plan = get_route_plan(table_size)
 
-    message = apply_reverse_e4(e4_matrix)
+        with tracing.span("transpose", len(input_text)):
+            return plan.decrypt(input_text)
 
-    return message
+    with tracing.span("transpose", len(input_text)):
+        message = [''] * len(input_text)
+        transpose_route(input_text, message, table_size, reverse=True)
+
+    with tracing.span("join", len(input_text)):
+        return ''.join(message)
 
 
 def execute_tests() -> None:
@@ -234,6 +595,64 @@ def execute_tests() -> None:
             else:
                 faulty_tests.append((message, size))
 
+    # Primes and factors, including products of two large primes which trial
+    # division alone would take long to split
+    prime_tests = [
+        (1, False), (2, True), (97, True), (561, False), (1000003, True),
+        (999983 * 1000003, False), (2**61 - 1, True)
+    ]
+
+    for number, expected in prime_tests:
+        total += 1
+
+        if is_prime(number) == expected:
+            total_correct += 1
+
+        else:
+            faulty_tests.append(("is_prime", number))
+
+    factor_tests = [
+        (1, {}),
+        (360, {2: 3, 3: 2, 5: 1}),
+        (1009 ** 2, {1009: 2}),
+        (999983 * 1000003, {999983: 1, 1000003: 1}),
+        (2**4 * 1000000007 * 998244353, {2: 4, 1000000007: 1, 998244353: 1}),
+    ]
+
+    for number, expected in factor_tests:
+        total += 1
+
+        if factorize(number) == expected:
+            total_correct += 1
+
+        else:
+            faulty_tests.append(("factorize", number))
+
+    # Padded table sizes of a prime length fit the message with the least
+    # padding first, and the padded message round-trips
+    message = "Route encryption with a prime length message of seventy-one characters!"
+
+    padded_sizes = get_padded_table_sizes(len(message))
+
+    (row_count, col_count), padding = padded_sizes[0]
+
+    padded_message = pad_message(message, (row_count, col_count))
+
+    checks = [
+        len(padded_sizes) > 0,
+        all(size[0] * size[1] == len(message) + size_padding for size, size_padding in padded_sizes),
+        [size_padding for _, size_padding in padded_sizes] == sorted(size_padding for _, size_padding in padded_sizes),
+        len(padded_message) == row_count * col_count == len(message) + padding,
+        route_decrypt(route_encrypt(padded_message, (row_count, col_count)), (row_count, col_count))[:len(message)] == message,
+        get_padded_table_sizes(0) == (),
+    ]
+
+    total += len(checks)
+    total_correct += sum(checks)
+
+    if not all(checks):
+        faulty_tests.append(("padding", checks))
+
     print(f"\nGot {total_correct} correct out of {total}")
 
     if faulty_tests:
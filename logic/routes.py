@@ -0,0 +1,394 @@
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from .route_encryption import iter_e4_indices
+
+
+# NOTE
+#   A route is the order in which a table is visited, given as the flat
+#   (row-major) index of every cell. Writing a message along route W puts
+#   letter k into cell W[k], and reading along route R takes cell R[k] as
+#   letter k of the output, so a write / read pair is a single permutation:
+#   output[k] = message[W^-1[R[k]]].
+#
+#   Permutations are stored as gather lists (applying p to a sequence gives
+#   [sequence[i] for i in p]), which makes composing and inverting them a
+#   single pass each.
+
+# Maximum number of compiled route ciphers kept around by get_route_cipher
+ROUTE_CACHE_SIZE = 256
+
+
+class Permutation:
+    """
+    Rearrangement of a sequence, stored as the index every output position is
+    gathered from
+    """
+
+    def __init__(self, indices: Iterable[int]) -> None:
+        self.indices: Tuple[int, ...] = tuple(indices)
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Permutation) and self.indices == other.indices
+
+    def __hash__(self) -> int:
+        return hash(self.indices)
+
+    def __repr__(self) -> str:
+        return f"Permutation({list(self.indices)!r})"
+
+    def apply(self, sequence: Sequence) -> list:
+        """
+        Returns the elements of given sequence in the order of the permutation
+        """
+        if len(sequence) != len(self.indices):
+            raise ValueError(
+                f"Permutation has length {len(self.indices)}, got a sequence of length {len(sequence)}")
+
+        return [sequence[i] for i in self.indices]
+
+    def then(self, other: 'Permutation') -> 'Permutation':
+        """
+        Returns the permutation that applies this one and then the other one
+        """
+        if len(other) != len(self):
+            raise ValueError(f"Cannot compose permutations of lengths {len(self)} and {len(other)}")
+
+        return Permutation([self.indices[i] for i in other.indices])
+
+    def inverse(self) -> 'Permutation':
+        """
+        Returns the permutation that undoes this one
+        """
+        inverse = [0] * len(self.indices)
+
+        for position, index in enumerate(self.indices):
+            inverse[index] = position
+
+        return Permutation(inverse)
+
+
+def iter_rows(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Rows from top to bottom, each one from left to right
+    """
+    return iter(range(table_size[0] * table_size[1]))
+
+
+def iter_columns(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Columns from left to right, each one from top to bottom
+    """
+    row_count, col_count = table_size
+
+    for col in range(col_count):
+        yield from range(col, row_count * col_count, col_count)
+
+
+def iter_snake_rows(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Rows from top to bottom, alternating between left to right and right to
+    left (boustrophedon)
+    """
+    row_count, col_count = table_size
+
+    for row in range(row_count):
+        start = row * col_count
+
+        if row % 2 == 0:
+            yield from range(start, start + col_count)
+        else:
+            yield from range(start + col_count - 1, start - 1, -1)
+
+
+def iter_snake_columns(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Columns from left to right, alternating between top to bottom and bottom
+    to top
+    """
+    row_count, col_count = table_size
+
+    for col in range(col_count):
+        if col % 2 == 0:
+            yield from range(col, row_count * col_count, col_count)
+        else:
+            yield from range((row_count - 1) * col_count + col, -1, -col_count)
+
+
+def iter_spiral(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Clockwise spiral from the top left corner towards the middle
+    """
+    row_count, col_count = table_size
+
+    top, bottom, left, right = 0, row_count - 1, 0, col_count - 1
+
+    while top <= bottom and left <= right:
+        yield from range(top * col_count + left, top * col_count + right + 1)
+        yield from range((top + 1) * col_count + right, (bottom + 1) * col_count + right, col_count)
+
+        if top < bottom:
+            yield from range(bottom * col_count + right - 1, bottom * col_count + left - 1, -1)
+
+        if left < right:
+            yield from range((bottom - 1) * col_count + left, top * col_count + left, -col_count)
+
+        top, bottom, left, right = top + 1, bottom - 1, left + 1, right - 1
+
+
+def iter_counter_spiral(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Counter-clockwise spiral from the top left corner towards the middle
+    """
+    row_count, col_count = table_size
+
+    # A counter-clockwise spiral is a clockwise one over the transposed table
+    for index in iter_spiral((col_count, row_count)):
+        row, col = divmod(index, row_count)
+        yield col * col_count + row
+
+
+def iter_diagonals(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Diagonals from the top left corner, each one from top right to bottom left
+    """
+    row_count, col_count = table_size
+
+    step = max(col_count - 1, 1)
+
+    for diag in range(row_count + col_count - 1):
+        first_row = max(0, diag - col_count + 1)
+        last_row = min(row_count - 1, diag)
+
+        start = first_row * col_count + (diag - first_row)
+
+        yield from range(start, start + (last_row - first_row + 1) * step, step)
+
+
+def iter_diagonals_up_right(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Diagonals from the top left corner, each one from bottom left to top right
+    """
+    row_count, col_count = table_size
+
+    # Transposing the table keeps the diagonals and their order, but turns
+    # each one around
+    for index in iter_diagonals((col_count, row_count)):
+        row, col = divmod(index, row_count)
+        yield col * col_count + row
+
+
+def _iter_mirrored(route: Callable[[Tuple[int, int]], Iterator[int]], table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Given route over the left to right mirror image of the table
+    """
+    col_count = table_size[1]
+
+    for index in route(table_size):
+        row, col = divmod(index, col_count)
+        yield row * col_count + col_count - 1 - col
+
+
+def iter_diagonals_down_right(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Diagonals from the top right corner, each one from top left to bottom right
+    """
+    return _iter_mirrored(iter_diagonals, table_size)
+
+
+def iter_diagonals_up_left(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    Diagonals from the top right corner, each one from bottom right to top left
+    """
+    return _iter_mirrored(iter_diagonals_up_right, table_size)
+
+
+def iter_b3(table_size: Tuple[int, int]) -> Iterator[int]:
+    """
+    B3 route: columns from left to right, each one from bottom to top
+    """
+    row_count, col_count = table_size
+
+    for col in range(col_count):
+        yield from range((row_count - 1) * col_count + col, -1, -col_count)
+
+
+ROUTES: Dict[str, Callable[[Tuple[int, int]], Iterator[int]]] = {}
+
+
+def register_route(name: str, route: Callable[[Tuple[int, int]], Iterator[int]]) -> None:
+    """
+    Registers a route under given name, after which it can be used as a write
+    or read route. A route takes a table size and yields the flat index of
+    every cell in the order they are visited.
+    """
+    ROUTES[name] = route
+
+    # Routes compiled under the same name before are no longer valid
+    get_route.cache_clear()
+    get_route_cipher.cache_clear()
+
+
+def get_supported_routes() -> List[str]:
+    """
+    Returns names of all registered routes
+    """
+    return list(ROUTES)
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def get_route(name: str, table_size: Tuple[int, int]) -> Permutation:
+    """
+    Returns the route with given name over a table of given size, as the
+    permutation that reads the cells of the table in route order
+    """
+    try:
+        route = ROUTES[name]
+
+    except KeyError:
+        raise ValueError(f"Unsupported Route ({name})") from None
+
+    permutation = Permutation(route(tuple(table_size)))
+
+    if sorted(permutation.indices) != list(range(table_size[0] * table_size[1])):
+        raise ValueError(f"Route '{name}' does not visit every cell of a {table_size[0]} x {table_size[1]} table once")
+
+    return permutation
+
+
+class RouteCipher:
+    """
+    Compiled form of one write route & read route pair for one table size. Both
+    directions are a single gather.
+    """
+
+    def __init__(self, write_route: str, read_route: str, table_size: Tuple[int, int]) -> None:
+        self.write_route = write_route
+        self.read_route = read_route
+        self.table_size = table_size
+
+        # Writing along a route is undoing a read along it
+        self.permutation = get_route(write_route, table_size).inverse().then(get_route(read_route, table_size))
+        self.inverse = self.permutation.inverse()
+
+    def encrypt(self, message: str) -> str:
+        """
+        Writes given message along the write route and reads it out along the
+        read route
+        """
+        return ''.join(self.permutation.apply(message))
+
+    def decrypt(self, encrypted_text: str) -> str:
+        """
+        Writes given encrypted message along the read route and reads it out
+        along the write route
+        """
+        return ''.join(self.inverse.apply(encrypted_text))
+
+    def get_matrix(self, message: str) -> List[List[str]]:
+        """
+        Returns the matrix given message fills when written along the write
+        route
+        """
+        cells = get_route(self.write_route, self.table_size).inverse().apply(message)
+        col_count = self.table_size[1]
+
+        return [cells[row * col_count:(row + 1) * col_count] for row in range(self.table_size[0])]
+
+
+@lru_cache(maxsize=ROUTE_CACHE_SIZE)
+def get_route_cipher(write_route: str, read_route: str, table_size: Tuple[int, int]) -> RouteCipher:
+    """
+    Returns the compiled cipher for given routes and table size. Ciphers are
+    kept in a bounded LRU cache so repeated traffic skips compiling.
+    """
+    return RouteCipher(write_route, read_route, tuple(table_size))
+
+
+def encrypt_with_routes(message: str, table_size: Tuple[int, int], write_route: str = "E4", read_route: str = "B3") -> str:
+    """
+    Encrypts given message by writing it into a table of given size along one
+    route and reading it out along another
+    """
+    return get_route_cipher(write_route, read_route, tuple(table_size)).encrypt(message)
+
+
+def decrypt_with_routes(encrypted_text: str, table_size: Tuple[int, int], write_route: str = "E4", read_route: str = "B3") -> str:
+    """
+    Decrypts given message encrypted with encrypt_with_routes using the same
+    routes and table size
+    """
+    return get_route_cipher(write_route, read_route, tuple(table_size)).decrypt(encrypted_text)
+
+
+register_route("rows", iter_rows)
+register_route("columns", iter_columns)
+register_route("snake_rows", iter_snake_rows)
+register_route("snake_columns", iter_snake_columns)
+register_route("spiral", iter_spiral)
+register_route("counter_spiral", iter_counter_spiral)
+register_route("diagonals", iter_diagonals)
+register_route("diagonals_up_right", iter_diagonals_up_right)
+register_route("diagonals_down_right", iter_diagonals_down_right)
+register_route("diagonals_up_left", iter_diagonals_up_left)
+register_route("E4", iter_e4_indices)
+register_route("B3", iter_b3)
+
+
+def execute_tests() -> None:
+    """
+    Checks every pair of routes round-trips, and that E4 & B3 match
+    route_encrypt
+    """
+    from .route_encryption import route_encrypt
+
+    message = "ALLTHATGLITTERSISNOTGOLDAB"
+
+    total = 0
+    total_correct = 0
+
+    for table_size in [(1, 26), (2, 13), (13, 2), (26, 1)]:
+        for write_route in ROUTES:
+            for read_route in ROUTES:
+                encrypted_message = encrypt_with_routes(message, table_size, write_route, read_route)
+
+                total += 1
+
+                if decrypt_with_routes(encrypted_message, table_size, write_route, read_route) == message:
+                    total_correct += 1
+
+        total += 1
+
+        if encrypt_with_routes(message, table_size) == route_encrypt(message, table_size):
+            total_correct += 1
+
+    # Cells of a 3 x 4 table in the order every diagonal route visits them
+    diagonal_routes = {
+        "diagonals": [0, 1, 4, 2, 5, 8, 3, 6, 9, 7, 10, 11],
+        "diagonals_up_right": [0, 4, 1, 8, 5, 2, 9, 6, 3, 10, 7, 11],
+        "diagonals_down_right": [3, 2, 7, 1, 6, 11, 0, 5, 10, 4, 9, 8],
+        "diagonals_up_left": [3, 7, 2, 11, 6, 1, 10, 5, 0, 9, 4, 8],
+    }
+
+    for name, expected in diagonal_routes.items():
+        for table_size in [(3, 4), (4, 3), (1, 5), (5, 1)]:
+            total += 1
+
+            if table_size == (3, 4):
+                is_correct = list(get_route(name, table_size).indices) == expected
+            else:
+                # Raises if the route misses or repeats a cell
+                is_correct = len(get_route(name, table_size)) == table_size[0] * table_size[1]
+
+            if is_correct:
+                total_correct += 1
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+
+if __name__ == '__main__':
+
+    execute_tests()
@@ -0,0 +1,504 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import argparse
+import asyncio
+import json
+import os
+
+from .batch import get_group_key, run_jobs
+
+
+# NOTE
+#   A small HTTP/1.1 server offering both ciphers on localhost:
+#
+#       POST /luigi-sacco/encrypt   {"key": "...", "lang": "TR", "text": "..."}
+#       POST /luigi-sacco/decrypt   {"key": "...", "lang": "TR", "text": "..."}
+#       POST /route/encrypt         {"table_size": [4, 5], "text": "..."}
+#       POST /route/decrypt         {"table_size": [4, 5], "text": "..."}
+#       GET  /stats
+#
+#   Responses are {"result": "..."} or {"error": "..."}, the same as the
+#   results of batch jobs (see logic/batch.py), which is what requests are
+#   turned into. Jobs that fail answer with 400, and failures of the service
+#   itself (such as a broken worker pool) with 500.
+#
+#   Requests are not run one by one on the event loop. They go into a bounded
+#   queue, and a dispatcher collects whatever arrives within a short window
+#   into a micro-batch. The batch is split into groups sharing a key (or table
+#   size), and every group runs as a single call to run_jobs in the executor,
+#   so a worker compiles its key schedule or route plan once per group and
+#   reuses it from its caches after that.
+#
+#   When the queue is full, connections wait before reading their next
+#   request, which pushes back on clients through TCP. The number of groups
+#   running in the executor at once is bounded too, so a full executor fills
+#   up the queue.
+
+ROUTES = {
+    "/luigi-sacco/encrypt": ("luigi_sacco", "encrypt"),
+    "/luigi-sacco/decrypt": ("luigi_sacco", "decrypt"),
+    "/route/encrypt": ("route", "encrypt"),
+    "/route/decrypt": ("route", "decrypt"),
+}
+
+STATUS_TEXTS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    411: "Length Required",
+    413: "Payload Too Large",
+    431: "Request Header Fields Too Large",
+    500: "Internal Server Error",
+}
+
+DEFAULT_PORT = 8080
+
+# Seconds the dispatcher waits after the first request of a batch for more
+# requests to arrive
+DEFAULT_BATCH_WINDOW = 0.002
+
+DEFAULT_MAX_BATCH_SIZE = 256
+
+DEFAULT_MAX_QUEUE_SIZE = 1024
+
+DEFAULT_MAX_BODY_SIZE = 16 * 1024 * 1024
+
+# Seconds an idle keep-alive connection is kept open
+DEFAULT_KEEP_ALIVE_TIMEOUT = 15.0
+
+
+class HTTPError(Exception):
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class CipherService:
+    """
+    Asyncio HTTP server running cipher requests in micro-batches
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT, executor: Optional[Executor] = None,
+                 workers: Optional[int] = None, batch_window: float = DEFAULT_BATCH_WINDOW,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+                 max_body_size: int = DEFAULT_MAX_BODY_SIZE, keep_alive_timeout: float = DEFAULT_KEEP_ALIVE_TIMEOUT) -> None:
+
+        self.host = host
+        self.port = port
+
+        self.workers = workers or os.cpu_count() or 1
+
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.max_queue_size = max_queue_size
+        self.max_body_size = max_body_size
+        self.keep_alive_timeout = keep_alive_timeout
+
+        self.executor = executor
+        self._owns_executor = executor is None
+
+        self.stats = {"requests": 0, "batches": 0, "groups": 0}
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Open connections, closed by close() so their handlers end on their own
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+
+    async def start(self) -> None:
+        """
+        Starts listening. If port is 0, self.port is set to the port picked by
+        the OS.
+        """
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue_size)
+
+        # Every worker gets one group running and one waiting
+        self._running_groups = asyncio.Semaphore(self.workers * 2)
+
+        self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        """
+        Stops listening and shuts down the dispatcher (and executor, unless it
+        was given)
+        """
+        if self._server is not None:
+            self._server.close()
+
+        connections = list(self._connections.items())
+
+        for writer, _ in connections:
+            writer.close()
+
+        await asyncio.gather(*[task for _, task in connections], return_exceptions=True)
+
+        if self._server is not None:
+            await self._server.wait_closed()
+
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+
+        if self._owns_executor and self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    async def serve_forever(self) -> None:
+        await self.start()
+
+        try:
+            await self._server.serve_forever()
+
+        finally:
+            await self.close()
+
+    async def submit(self, job: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Queues given batch job (see logic/batch.py) and returns its result once
+        its micro-batch has run. Waits for room in the queue when it is full,
+        and raises what the executor failed with if it couldn't run the batch.
+        """
+        future = asyncio.get_event_loop().create_future()
+
+        await self._queue.put((job, future))
+
+        self.stats["requests"] += 1
+
+        return await future
+
+    async def _dispatch(self) -> None:
+        """
+        Collects queued jobs into micro-batches and sends every group of jobs
+        sharing a key (or table size) to the executor
+        """
+        while True:
+            items = [await self._queue.get()]
+
+            if self.batch_window > 0:
+                await asyncio.sleep(self.batch_window)
+
+            while len(items) < self.max_batch_size and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+
+            groups: Dict[Tuple[str, str, str], List[Tuple[Dict[str, Any], asyncio.Future]]] = {}
+
+            for job, future in items:
+                groups.setdefault(get_group_key(job), []).append((job, future))
+
+            self.stats["batches"] += 1
+
+            for group in groups.values():
+                await self._running_groups.acquire()
+
+                self.stats["groups"] += 1
+
+                asyncio.ensure_future(self._run_group(group))
+
+    async def _run_group(self, group: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        try:
+            results = await asyncio.get_event_loop().run_in_executor(self.executor, run_jobs, [job for job, _ in group])
+
+        except Exception as e:
+            # Jobs report their own errors in their results, so this is the
+            # executor failing. Every request of the group gets the exception.
+            for _, future in group:
+                if not future.done():
+                    future.set_exception(e)
+
+            return
+
+        finally:
+            self._running_groups.release()
+
+        for (_, future), result in zip(group, results):
+            # Client may have gone away in the mean time
+            if not future.done():
+                future.set_result(result)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._connections[writer] = asyncio.current_task()
+
+        try:
+            keep_alive = True
+
+            while keep_alive:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), self.keep_alive_timeout)
+
+                except asyncio.TimeoutError:
+                    break
+
+                if request is None:
+                    break
+
+                method, path, headers, body, keep_alive = request
+
+                try:
+                    status, response = await self._handle_request(method, path, body)
+
+                except HTTPError as e:
+                    status, response = e.status, {"error": str(e)}
+
+                self._write_response(writer, status, response, keep_alive)
+
+                await writer.drain()
+
+        except HTTPError as e:
+            # Request couldn't be read, so the connection can't be reused
+            self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+        finally:
+            del self._connections[writer]
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        """
+        Reads one request and returns its method, path, headers, body and
+        whether the connection is kept alive after it. Returns None if the
+        client closed the connection.
+        """
+        try:
+            request_line = await reader.readline()
+
+        except (ValueError, asyncio.LimitOverrunError):
+            raise HTTPError(400, "Request line is too long") from None
+
+        if not request_line:
+            return None
+
+        try:
+            method, path, version = request_line.decode("latin-1").split()
+
+        except ValueError:
+            raise HTTPError(400, "Malformed request line") from None
+
+        headers: Dict[str, str] = {}
+
+        while True:
+            try:
+                line = await reader.readline()
+
+            except (ValueError, asyncio.LimitOverrunError):
+                raise HTTPError(431, "Request header is too long") from None
+
+            if line in (b"\r\n", b"\n", b""):
+                break
+
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HTTPError(411, "Chunked requests are not supported, send a Content-Length")
+
+        try:
+            content_length = int(headers.get("content-length", "0"))
+
+        except ValueError:
+            raise HTTPError(400, "Invalid Content-Length") from None
+
+        if content_length > self.max_body_size:
+            raise HTTPError(413, f"Request body is over {self.max_body_size} bytes")
+
+        body = await reader.readexactly(content_length) if content_length > 0 else b""
+
+        connection = headers.get("connection", "").lower()
+
+        if version == "HTTP/1.0":
+            keep_alive = connection == "keep-alive"
+        else:
+            keep_alive = connection != "close"
+
+        return method, path, headers, body, keep_alive
+
+    async def _handle_request(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """
+        Returns the status and JSON response of given request
+        """
+        if path == "/stats":
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+
+            return 200, dict(self.stats, queued=self._queue.qsize())
+
+        if path not in ROUTES:
+            raise HTTPError(404, f"Unknown endpoint ({path})")
+
+        if method != "POST":
+            raise HTTPError(405, "Use POST")
+
+        try:
+            job = json.loads(body.decode("utf-8"))
+
+        except ValueError:
+            raise HTTPError(400, "Request body is not valid JSON") from None
+
+        if not isinstance(job, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+
+        job["cipher"], job["action"] = ROUTES[path]
+
+        try:
+            result = await self.submit(job)
+
+        except Exception as e:
+            raise HTTPError(500, f"Request could not be run ({type(e).__name__}: {e})") from None
+
+        return (400 if "error" in result else 200), result
+
+    def _write_response(self, writer: asyncio.StreamWriter, status: int, response: Dict[str, Any], keep_alive: bool) -> None:
+        body = json.dumps(response, ensure_ascii=False).encode("utf-8")
+
+        writer.write(
+            f"HTTP/1.1 {status} {STATUS_TEXTS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n".encode("latin-1") + body
+        )
+
+
+def execute_tests() -> None:
+    """
+    Starts the service on a free port and checks concurrent requests are
+    micro-batched and grouped by key, and that every kind of failure gets its
+    status
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .luigi_sacco import luigi_sacco_encrypt
+    from .route_encryption import route_encrypt
+
+    async def request(port: int, method: str, path: str, body: bytes = b"", headers: str = "") -> Tuple[int, Dict[str, Any]]:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n{headers}Connection: close\r\n\r\n".encode("latin-1") + body)
+
+        response = await reader.read()
+        writer.close()
+
+        head, _, response_body = response.partition(b"\r\n\r\n")
+
+        return int(head.split()[1]), json.loads(response_body)
+
+    def encode(job: Dict[str, Any]) -> bytes:
+        return json.dumps(job, ensure_ascii=False).encode("utf-8")
+
+    async def run_tests() -> Tuple[int, int, List[Any]]:
+        total, total_correct = 0, 0
+        faulty_tests: List[Any] = []
+
+        def check(name: str, is_correct: bool) -> None:
+            nonlocal total, total_correct
+
+            total += 1
+
+            if is_correct:
+                total_correct += 1
+            else:
+                faulty_tests.append(name)
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            service = CipherService(port=0, executor=executor, workers=2, batch_window=0.05)
+            await service.start()
+
+            try:
+                # Concurrent requests with two keys and one table size
+                jobs = [("/luigi-sacco/encrypt", {"key": ["TERAZİ", "ANAHTAR"][i % 2], "lang": "TR", "text": f"Mesaj {'a' * i}"})
+                        for i in range(20)]
+                jobs += [("/route/encrypt", {"table_size": [2, 3], "text": f"ABCDE{i}"}) for i in range(10)]
+
+                responses = await asyncio.gather(*[request(service.port, "POST", path, encode(job)) for path, job in jobs])
+
+                expected = [luigi_sacco_encrypt(job["key"], job["text"], "TR") if "key" in job else route_encrypt(job["text"], (2, 3))
+                            for _, job in jobs]
+
+                check("results", list(responses) == [(200, {"result": result}) for result in expected])
+
+                status, stats = await request(service.port, "GET", "/stats")
+
+                check("micro-batching", status == 200 and stats["requests"] == 30 and stats["batches"] < 30)
+                check("grouping", stats["groups"] < 30 and stats["groups"] >= 3)
+
+                # Errors
+                check("failing job", (await request(service.port, "POST", "/luigi-sacco/encrypt", encode({"key": "K", "lang": "EN", "text": "ş"})))[0] == 400)
+                check("invalid json", (await request(service.port, "POST", "/route/encrypt", b"{"))[0] == 400)
+                check("unknown path", (await request(service.port, "POST", "/caesar", encode({})))[0] == 404)
+                check("wrong method", (await request(service.port, "GET", "/route/encrypt"))[0] == 405)
+                check("long header", (await request(service.port, "GET", "/stats", headers=f"X-Long: {'a' * (1 << 17)}\r\n"))[0] == 431)
+
+            finally:
+                await service.close()
+
+        # Executor that can't run anything anymore
+        broken_executor = ThreadPoolExecutor(max_workers=1)
+        broken_executor.shutdown()
+
+        service = CipherService(port=0, executor=broken_executor, workers=1, batch_window=0)
+        await service.start()
+
+        try:
+            status, response = await request(service.port, "POST", "/route/encrypt", encode({"text": "ABCD"}))
+
+            check("broken executor", status == 500 and "error" in response)
+
+        finally:
+            await service.close()
+
+        return total, total_correct, faulty_tests
+
+    total, total_correct, faulty_tests = asyncio.run(run_tests())
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+    if faulty_tests:
+        print("\n")
+        [print(row) for row in faulty_tests]
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+
+    parser = argparse.ArgumentParser(
+        prog="python -m logic.service",
+        description="Serves Luigi Sacco and Route Encryption over HTTP, running requests in micro-batches"
+    )
+
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port to listen on")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="number of worker processes")
+    parser.add_argument("--batch-window", type=float, default=DEFAULT_BATCH_WINDOW, help="seconds to wait for more requests before running a batch")
+    parser.add_argument("--max-batch-size", type=int, default=DEFAULT_MAX_BATCH_SIZE, help="most requests in one batch")
+    parser.add_argument("--max-queue-size", type=int, default=DEFAULT_MAX_QUEUE_SIZE, help="most requests waiting for a batch before clients are slowed down")
+
+    args = parser.parse_args(argv)
+
+    service = CipherService(args.host, args.port, workers=args.workers, batch_window=args.batch_window,
+                            max_batch_size=args.max_batch_size, max_queue_size=args.max_queue_size)
+
+    print(f"Serving on http://{args.host}:{args.port}")
+
+    try:
+        asyncio.run(service.serve_forever())
+
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+
+    main()
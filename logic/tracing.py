@@ -0,0 +1,277 @@
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+import sys
+import time
+
+
+# NOTE
+#   Cipher functions mark their stages with named spans:
+#
+#       with tracing.span("transpose", len(message)):
+#           ...
+#
+#   Finished spans are sent to every registered sink along with their duration
+#   and the size of what they worked on. Stage names in use are 'normalize',
+#   'key-schedule', 'layout', 'transpose', 'redistribute' and 'join'.
+#
+#   Matrices and other intermediate steps (which used to be printed by the
+#   'verbose' flags) are sent as snapshots. They are passed in as callables and
+#   only built when a sink asks for snapshots.
+#
+#   Sinks are kept in a context variable, not a global list, so they are only
+#   active in the thread or asyncio task that added them (and tasks it starts
+#   afterwards). Two requests traced at the same time each see their own spans.
+#
+#   With no sinks registered, span() hands out one shared do-nothing context
+#   manager and snapshot() returns right away, so instrumented code costs a
+#   function call and an empty check per stage.
+
+class SpanRecord(NamedTuple):
+    name: str
+    seconds: float
+    size: int
+
+
+class Sink:
+    """
+    Receives finished spans and, if capture_snapshots is True, snapshots of
+    intermediate steps
+    """
+
+    capture_snapshots = False
+
+    def record_span(self, record: SpanRecord) -> None:
+        pass
+
+    def record_snapshot(self, name: str, value: Any) -> None:
+        pass
+
+
+class CollectingSink(Sink):
+    """
+    Keeps every span (and snapshot, if asked to) in memory
+    """
+
+    def __init__(self, capture_snapshots: bool = False) -> None:
+        self.capture_snapshots = capture_snapshots
+
+        self.spans: List[SpanRecord] = []
+        self.snapshots: List[tuple] = []
+
+    def record_span(self, record: SpanRecord) -> None:
+        self.spans.append(record)
+
+    def record_snapshot(self, name: str, value: Any) -> None:
+        self.snapshots.append((name, value))
+
+    def get_totals(self) -> dict:
+        """
+        Returns total seconds spent in every span name
+        """
+        totals: dict = {}
+
+        for record in self.spans:
+            totals[record.name] = totals.get(record.name, 0.0) + record.seconds
+
+        return totals
+
+
+class PrintingSink(Sink):
+    """
+    Prints every span and snapshot as it arrives. Matrices are printed one row
+    per line.
+    """
+
+    capture_snapshots = True
+
+    def __init__(self, file=None) -> None:
+        self.file = file
+
+    def record_span(self, record: SpanRecord) -> None:
+        print(f"[{record.name}] {record.seconds * 1000:.3f} ms ({record.size} items)", file=self.file or sys.stdout)
+
+    def record_snapshot(self, name: str, value: Any) -> None:
+        file = self.file or sys.stdout
+
+        print(f"\n{name}", file=file)
+
+        if isinstance(value, list) and value and isinstance(value[0], list):
+            for row in value:
+                print(row, file=file)
+        else:
+            print(value, file=file)
+
+
+# Sinks active in the current context
+_SINKS: ContextVar[Tuple[Sink, ...]] = ContextVar("tracing_sinks", default=())
+
+_NULL_SPAN = nullcontext()
+
+
+def get_sinks() -> Tuple[Sink, ...]:
+    """
+    Returns the sinks active in the current context
+    """
+    return _SINKS.get()
+
+
+def add_sink(sink: Sink) -> None:
+    """
+    Starts sending spans (and snapshots) of the current context to given sink
+    """
+    _SINKS.set(_SINKS.get() + (sink,))
+
+
+def remove_sink(sink: Sink) -> None:
+    """
+    Stops sending anything to given sink. Raises ValueError if it is not active
+    in the current context.
+    """
+    sinks = list(_SINKS.get())
+    sinks.remove(sink)
+
+    _SINKS.set(tuple(sinks))
+
+
+@contextmanager
+def using_sink(sink: Sink) -> Iterator[Sink]:
+    """
+    Sends spans (and snapshots) to given sink for the duration of the with block
+    """
+    token = _SINKS.set(_SINKS.get() + (sink,))
+
+    try:
+        yield sink
+
+    finally:
+        _SINKS.reset(token)
+
+
+class _Span:
+
+    __slots__ = ("name", "size", "start")
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = size
+
+    def __enter__(self) -> '_Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        record = SpanRecord(self.name, time.perf_counter() - self.start, self.size)
+
+        for sink in _SINKS.get():
+            sink.record_span(record)
+
+
+def span(name: str, size: int = 0):
+    """
+    Returns a context manager timing the stage with given name, which works on
+    given number of items. Does nothing when there are no sinks.
+    """
+    if not _SINKS.get():
+        return _NULL_SPAN
+
+    return _Span(name, size)
+
+
+def wants_snapshots() -> bool:
+    """
+    Returns whether any sink asks for snapshots
+    """
+    return any(sink.capture_snapshots for sink in _SINKS.get())
+
+
+def snapshot(name: str, build: Callable[[], Any]) -> None:
+    """
+    Sends what build returns to every sink asking for snapshots. build is only
+    called if there is such a sink.
+    """
+    sinks = _SINKS.get()
+
+    if not sinks:
+        return
+
+    value: Optional[Any] = None
+    built = False
+
+    for sink in sinks:
+        if sink.capture_snapshots:
+            if not built:
+                value, built = build(), True
+
+            sink.record_snapshot(name, value)
+
+
+def execute_tests() -> None:
+    """
+    Checks that sinks only see spans of the thread and asyncio task that added
+    them
+    """
+    import asyncio
+    import threading
+
+    total = 0
+    total_correct = 0
+
+    # Threads
+    sinks = [CollectingSink(), CollectingSink()]
+
+    def trace_in_thread(sink: CollectingSink, name: str) -> None:
+        with using_sink(sink):
+            for _ in range(100):
+                with span(name):
+                    pass
+
+    threads = [threading.Thread(target=trace_in_thread, args=(sink, f"thread-{i}")) for i, sink in enumerate(sinks)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    for i, sink in enumerate(sinks):
+        total += 1
+
+        if [record.name for record in sink.spans] == [f"thread-{i}"] * 100:
+            total_correct += 1
+
+    # Asyncio tasks
+    async def trace_in_task(name: str) -> CollectingSink:
+        sink = CollectingSink()
+        add_sink(sink)
+
+        for _ in range(10):
+            with span(name):
+                await asyncio.sleep(0)
+
+        remove_sink(sink)
+
+        return sink
+
+    async def run_tasks():
+        return await asyncio.gather(*[trace_in_task(f"task-{i}") for i in range(3)])
+
+    for i, sink in enumerate(asyncio.run(run_tasks())):
+        total += 1
+
+        if [record.name for record in sink.spans] == [f"task-{i}"] * 10:
+            total_correct += 1
+
+    # Nothing leaks out into the calling context
+    total += 1
+
+    if get_sinks() == () and span("outside") is _NULL_SPAN:
+        total_correct += 1
+
+    print(f"\nGot {total_correct} correct out of {total}")
+
+
+if __name__ == '__main__':
+
+    execute_tests()
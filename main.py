@@ -1,18 +1,51 @@
-from typing import Callable, Literal, Tuple
+import time
 
+# Taken before anything else is imported, to measure cold start
+START_TIME = time.perf_counter()
+
+from functools import lru_cache
+from typing import Callable, Literal, Optional, Tuple
+import sys
+
+from PyQt5.QtCore import QTimer
 from PyQt5.QtWidgets import QApplication, QComboBox, QWidget
 from PyQt5.QtGui import QPixmap
 
 
 from gui import Gui
+from workers import JobRunner
 
-from logic.luigi_sacco import luigi_sacco_encrypt, luigi_sacco_decrypt, confirm_text_in_correct_lang, format_key_and_input_text
-from logic.route_encryption import create_empty_matrix, route_encrypt, route_decrypt, get_potential_table_sizes, apply_e4, apply_reverse_b3
+from logic.luigi_sacco import luigi_sacco_encrypt, luigi_sacco_decrypt
+from logic.normalization import InvalidCharacterError, normalize_text
+from logic.route_encryption import get_e4_matrix, get_padded_table_sizes, get_potential_table_sizes, is_prime, route_decrypt, route_encrypt
 
 import utils
 
 ENCRYPT, DECRYPT = (True, False), (False, True)
 
+# Table size suggestions are only updated once typing pauses for this long
+TABLE_SIZE_DEBOUNCE_MS = 250
+
+# Seconds from launch until the main menu is shown that
+# 'python main.py --measure-startup' accepts
+STARTUP_BUDGET_SECONDS = 1.0
+
+
+class LazyWindow:
+    """
+    Creates a window the first time it is needed instead of at launch
+    """
+
+    def __init__(self, create: Callable[[], Gui]) -> None:
+        self._create = create
+        self._window: Optional[Gui] = None
+
+    def get(self) -> Gui:
+        if self._window is None:
+            self._window = self._create()
+
+        return self._window
+
 
 def center_window(window: Gui) -> None:
     """
@@ -110,6 +143,9 @@ def create_luigi_sacco_window(main_window: Gui, show_error: Callable[[str, str,
 
     gui.hide()
 
+    # Cipher jobs run on a worker thread so the window stays responsive
+    gui.job_runner = JobRunner()
+
     gui.add_event_listener("backButton", lambda: goto_window(gui, main_window))
 
     return gui
@@ -144,6 +180,9 @@ def create_route_encryption_window(main_window: Gui, show_error: Callable[[str,
     # Make this window hidden by default
     gui.hide()
 
+    # Cipher jobs run on a worker thread so the window stays responsive
+    gui.job_runner = JobRunner()
+
     # Adding images for Route Visualization
     routes_image_path = utils.get_path_in_bundle_dir("assets/routes.png")
     routes_image = QPixmap(routes_image_path)
@@ -219,53 +258,126 @@ def run_luigi_sacco(window: Gui) -> None:
 
     action = get_selected_action(get)
 
-    output = ""
+    show_job_progress(window, 0)
 
+    # Normalizing, validating and the cipher itself all run on a worker thread
+    window.job_runner.submit(
+        luigi_sacco_job, key, plain_text, language, action,
+        on_result=lambda output: show_job_output(window, output),
+        on_error=lambda error: show_luigi_sacco_error(window, error),
+        on_progress=lambda percent: show_job_progress(window, percent)
+    )
 
-    formatted_key, formatted_plain_text = format_key_and_input_text(key, plain_text)
-    
-    # Confirm Language has been correctly chosen
-    try:
-        confirm_text_in_correct_lang(formatted_key, language)
-    except ValueError:
-        window.show_error(
-            title="Key has invalid characters",
-            content="Your key includes characters that do not belong in your chosen language",
-            solution="Remove any characters than don't belong to your chosen language and try again"
-        )
 
-        return
+def luigi_sacco_job(report_progress: Callable[[int], None], key: str, plain_text: str, language: str, action: Tuple[bool, bool]) -> str:
+    """
+    Normalizes and validates given key and text, then encrypts / decrypts the
+    text. Runs on a worker thread.
+    """
+    formatted_key = normalize_text(key, language, "key")
+    report_progress(10)
+
+    formatted_plain_text = normalize_text(plain_text, language)
+    report_progress(40)
+
+    # Both have already been normalized and validated above
+    if action == ENCRYPT:
+        output = luigi_sacco_encrypt(formatted_key, formatted_plain_text, language, normalized=True)
+
+    else:
+        output = luigi_sacco_decrypt(formatted_key, formatted_plain_text, language, normalized=True)
+
+    report_progress(100)
+
+    return output
+
+
+def show_luigi_sacco_error(window: Gui, error: Exception) -> None:
+    """
+    Shows the error a Luigi Sacco job failed with
+    """
+    show_job_progress(window, None)
+
+    if isinstance(error, InvalidCharacterError):
+        # Plain Text is capitalized in the message, the key isn't
+        title_name, content_name = ("Key", "key") if error.text_type == "key" else ("Plain Text", "Plain Text")
 
-    try:
-        confirm_text_in_correct_lang(formatted_plain_text, language)
-    except ValueError:
         window.show_error(
-            title="Plain Text has invalid characters",
-            content="Your Plain Text includes characters that do not belong in your chosen language",
+            title=f"{title_name} has invalid characters",
+            content=f"Your {content_name} includes characters that do not belong in your chosen language ('{error.character}' at position {error.position + 1})",
             solution="Remove any characters than don't belong to your chosen language and try again"
         )
 
         return
 
-    if action == ENCRYPT:
-        output = luigi_sacco_encrypt(key, plain_text, language)
+    show_job_error(window, error)
 
-    elif action == DECRYPT:
-        output = luigi_sacco_decrypt(key, plain_text, language)
 
-    get('outputTextEdit').setPlainText(output)
+def show_job_progress(window: Gui, percent: Optional[int]) -> None:
+    """
+    Shows progress of the running job in the status bar of given window, or
+    clears it when percent is None
+    """
+    if percent is None:
+        window.statusBar().clearMessage()
+
+    else:
+        window.statusBar().showMessage(f"Working... {percent}%")
+
+
+def show_job_output(window: Gui, output: str) -> None:
+    """
+    Sets the output of a finished job as the content of the output box
+    """
+    show_job_progress(window, None)
+
+    window.get_widget('outputTextEdit').setPlainText(output)
+
+
+def show_job_error(window: Gui, error: Exception) -> None:
+    """
+    Shows an error a job failed with unexpectedly
+    """
+    show_job_progress(window, None)
+
+    window.show_error(
+        title="Something went wrong",
+        content=str(error),
+        solution="Check your input and try again"
+    )
 
 
 def reset_luigi_sacco(window: Gui) -> None:
     """
     Resets gui in luigi sacco to blank state
     """
+    window.job_runner.cancel()
+    show_job_progress(window, None)
+
     window.get_widget('keyTextEdit').clear()
     window.get_widget('inputTextEdit').clear()
     window.get_widget('outputTextEdit').clear()
 
 
 
+@lru_cache(maxsize=256)
+def get_table_size_choices(message_length: int) -> Tuple[Tuple[Tuple[int, int], ...], Tuple[str, ...]]:
+    """
+    Returns the potential table sizes for given message length along with
+    their combobox labels. Shared by the combobox and the run path so neither
+    works them out again.
+    """
+    sizes, optimal_size = get_potential_table_sizes(message_length)
+
+    labels = tuple(
+        f"{size[0]} x {size[1]} (Recommended)" if size == optimal_size or size == optimal_size[::-1]
+        else f"{size[0]} x {size[1]}"
+        for size in sizes
+    )
+
+    return tuple(sizes), labels
+
+
 def get_chosen_table_size(input_text: str, get: Callable[[str], QWidget]) -> Tuple[int, int]:
     """
     Returns chosen table size from gui according to given input text
@@ -274,7 +386,7 @@ def get_chosen_table_size(input_text: str, get: Callable[[str], QWidget]) -> Tup
     if len(input_text) <= 0:
         return (0, 0)
 
-    sizes, _ = get_potential_table_sizes(len(input_text))
+    sizes, _ = get_table_size_choices(len(input_text))
 
     return sizes[get('arraySizeComboBox').currentIndex()]
 
@@ -303,6 +415,9 @@ def run_route_encryption(window: Gui) -> None:
     # Shortcut for ops in this function
     def get(x): return window.get_widget(x)
 
+    # Suggestions may still be waiting for typing to pause
+    flush_table_size_suggestions(window)
+
     input_text, table_size = get_route_encryption_input(get)
 
     if len(input_text) == 0:
@@ -313,42 +428,62 @@ def run_route_encryption(window: Gui) -> None:
         )
         return
 
-    elif len(input_text) > 50:
-        window.show_error(
-            title="Your input is too long",
-            content="Maximum allowed is 50 characters",
-            solution=f"You have entered {len(input_text)} characters. Please make sure your input is less than 50 characters."
-        )
-
-        return
+    # Tiny prime lengths can already fill a near-square table
+    padded_table_size, padding = get_padded_table_sizes(len(input_text))[0]
 
-    if utils.is_prime(len(input_text)):
+    if is_prime(len(input_text)) and padding > 0:
         window.show_error(
             title="Warning! Text Length is Prime",
             content=f"Your input text has a prime length of {len(input_text)} characters",
-            solution="To get better performance using this encryption method, add another letter to your message."
+            solution=f"To get better performance using this encryption method, add {padding} more character(s) to your message "
+                     f"to fit a {padded_table_size[0]} x {padded_table_size[1]} table."
         )
 
 
     # Encrypt vs. Decrypt
     action = get_selected_action(get)
 
-    # Final output message which goes to output box
-    output = ""
-    matrix_output = []
+    show_job_progress(window, 0)
 
+    window.job_runner.submit(
+        route_encryption_job, input_text, table_size, action,
+        on_result=lambda outputs: show_route_encryption_output(window, *outputs),
+        on_error=lambda error: show_job_error(window, error),
+        on_progress=lambda percent: show_job_progress(window, percent)
+    )
+
+
+def route_encryption_job(report_progress: Callable[[int], None], input_text: str, table_size: Tuple[int, int],
+                         action: Tuple[bool, bool]) -> Tuple[str, str]:
+    """
+    Encrypts / decrypts given text and formats the E4 matrix behind it. Runs on
+    a worker thread.
+    """
     if action == ENCRYPT:
         output = route_encrypt(input_text, table_size)
-        matrix_output = apply_e4(input_text, create_empty_matrix(table_size))
+        encrypted_text = output
 
-    elif action == DECRYPT:
+    else:
         output = route_decrypt(input_text, table_size)
-        matrix_output = apply_reverse_b3(input_text, table_size)
+        encrypted_text = input_text
+
+    report_progress(60)
 
     # Convert output matrix into a string
-    formatted_matrix_output = "\n".join(', '.join(row) for row in matrix_output)
-    get('outputTextEdit').setPlainText(output)
-    get('matrixOutputTextEdit').setPlainText(formatted_matrix_output)
+    formatted_matrix_output = "\n".join(', '.join(row) for row in get_e4_matrix(encrypted_text, table_size))
+
+    report_progress(100)
+
+    return output, formatted_matrix_output
+
+
+def show_route_encryption_output(window: Gui, output: str, formatted_matrix_output: str) -> None:
+    """
+    Sets the output and E4 matrix of a finished route encryption job
+    """
+    show_job_output(window, output)
+
+    window.get_widget('matrixOutputTextEdit').setPlainText(formatted_matrix_output)
 
 
 def reset_route_encryption(window: Gui) -> None:
@@ -358,6 +493,9 @@ def reset_route_encryption(window: Gui) -> None:
 
     def get(x): return window.get_widget(x)
 
+    window.job_runner.cancel()
+    show_job_progress(window, None)
+
     get('inputTextEdit').clear()
     get('outputTextEdit').clear()
     get('matrixOutputTextEdit').clear()
@@ -367,26 +505,37 @@ def reset_route_encryption(window: Gui) -> None:
 def populate_combobox(combobox: QComboBox, get_message: Callable[[], str]) -> None:
     """
     Populates given combobox with potential tables sizes for the given message.
-    """
-
-    combobox.clear()
 
+    Nothing is touched when the sizes are the same as the ones already listed
+    (they only depend on the length of the message), so the current selection
+    is kept.
+    """
     message = get_message()
 
-    if len(message) <= 0:
+    labels = get_table_size_choices(len(message))[1] if len(message) > 0 else ()
+
+    if tuple(combobox.itemText(i) for i in range(combobox.count())) == labels:
         return
 
-    # Populate combobox with list of sizes
-    sizes, optimal_size = get_potential_table_sizes(len(message))
+    previous_label = combobox.currentText()
 
-    for size in sizes:
-        if size == optimal_size or size == optimal_size[::-1]:
-            combobox.addItem(f"{size[0]} x {size[1]} (Recommended)")
+    combobox.clear()
+    combobox.addItems(labels)
 
-        else:
-            combobox.addItem(f"{size[0]} x {size[1]}")
+    # Keep the chosen size if the new message length still allows it
+    if previous_label in labels:
+        combobox.setCurrentIndex(labels.index(previous_label))
 
 
+def flush_table_size_suggestions(window: Gui) -> None:
+    """
+    Updates table size suggestions right away if they are waiting for typing
+    to pause
+    """
+    if window.table_size_timer.isActive():
+        window.table_size_timer.stop()
+        window.update_table_sizes()
+
 
 def add_route_encryption_hooks(window: Gui) -> None:
     """
@@ -404,9 +553,15 @@ def add_route_encryption_hooks(window: Gui) -> None:
     combobox = get('arraySizeComboBox')
 
     # As text gets typed, the table size combo-box gets filled with new values
-    get('inputTextEdit').textChanged.connect(
-        lambda: populate_combobox(combobox, lambda: get('inputTextEdit').toPlainText())
-    )
+    # once typing pauses
+    window.table_size_timer = QTimer(window)
+    window.table_size_timer.setSingleShot(True)
+    window.table_size_timer.setInterval(TABLE_SIZE_DEBOUNCE_MS)
+
+    window.update_table_sizes = lambda: populate_combobox(combobox, lambda: get('inputTextEdit').toPlainText())
+    window.table_size_timer.timeout.connect(window.update_table_sizes)
+
+    get('inputTextEdit').textChanged.connect(window.table_size_timer.start)
 
     # Run and Reset Button Listeners
     window.add_event_listener(
@@ -420,7 +575,7 @@ def add_route_encryption_hooks(window: Gui) -> None:
     )
 
 
-def add_luigi_sacco_hooks(luigi_sacco_window: Gui, info_window: Gui) -> None:
+def add_luigi_sacco_hooks(luigi_sacco_window: Gui, info_window: LazyWindow) -> None:
     """
     Hooks Luigi Sacco Gui with its Logic
     """
@@ -438,39 +593,66 @@ def add_luigi_sacco_hooks(luigi_sacco_window: Gui, info_window: Gui) -> None:
     luigi_sacco_window.add_event_listener('runButton', lambda: run_luigi_sacco(luigi_sacco_window))
     luigi_sacco_window.add_event_listener('resetButton', lambda: reset_luigi_sacco(luigi_sacco_window))
 
-    luigi_sacco_window.add_event_listener('informationButton', lambda: goto_window(luigi_sacco_window, info_window))
+    luigi_sacco_window.add_event_listener('informationButton', lambda: goto_window(luigi_sacco_window, info_window.get()))
+
+
+def report_startup_time() -> None:
+    """
+    Prints how long it took for the main menu to show up, and quits with an
+    error status if that is over budget
+    """
+    elapsed = time.perf_counter() - START_TIME
+
+    print(f"Main menu shown after {elapsed:.3f}s (budget {STARTUP_BUDGET_SECONDS:.3f}s)")
+
+    app.exit(0 if elapsed <= STARTUP_BUDGET_SECONDS else 1)
 
 
 if __name__ == '__main__':
 
-    app = QApplication([])
+    app = QApplication(sys.argv)
 
     screen_geometry = QApplication.desktop().screenGeometry()
     SCREEN_WIDTH = screen_geometry.width()
     SCREEN_HEIGHT = screen_geometry.height()
 
+    # Only the main menu is built at launch, every other window is built the
+    # first time it is navigated to
     main_window = create_main_window()
-    error_dialog = create_error_message_window()
+    error_dialog = LazyWindow(create_error_message_window)
 
-    show_error = lambda title, content, solution: display_error_message(error_dialog, title, content, solution)
+    show_error = lambda title, content, solution: display_error_message(error_dialog.get(), title, content, solution)
 
-    luigi_sacco_window = create_luigi_sacco_window(main_window, show_error)
-    luigi_sacco_info_window = create_luigi_sacco_info_window(luigi_sacco_window)
+    def create_luigi_sacco_window_with_hooks() -> Gui:
+        window = create_luigi_sacco_window(main_window, show_error)
+        info_window = LazyWindow(lambda: create_luigi_sacco_info_window(window))
 
-    route_encryption_window = create_route_encryption_window(main_window, show_error)
+        add_luigi_sacco_hooks(window, info_window)
+
+        return window
+
+    def create_route_encryption_window_with_hooks() -> Gui:
+        window = create_route_encryption_window(main_window, show_error)
+
+        add_route_encryption_hooks(window)
+
+        return window
+
+    luigi_sacco_window = LazyWindow(create_luigi_sacco_window_with_hooks)
+    route_encryption_window = LazyWindow(create_route_encryption_window_with_hooks)
 
     main_window.add_event_listener(
         "firstMethodButton",
-        lambda: goto_window(main_window, luigi_sacco_window)
+        lambda: goto_window(main_window, luigi_sacco_window.get())
     )
 
     main_window.add_event_listener(
         "secondMethodButton",
-        lambda: goto_window(main_window, route_encryption_window)
+        lambda: goto_window(main_window, route_encryption_window.get())
     )
 
-    add_luigi_sacco_hooks(luigi_sacco_window, luigi_sacco_info_window)
-
-    add_route_encryption_hooks(route_encryption_window)
+    # Runs as soon as the event loop has shown the main menu
+    if "--measure-startup" in sys.argv:
+        QTimer.singleShot(0, report_startup_time)
 
-    app.exec_()
+    sys.exit(app.exec_())
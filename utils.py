@@ -1,9 +1,13 @@
+from functools import lru_cache
 from typing import Any, Dict, List, Union
 
 import sys
 import os
 import json
 
+# Kept here for backwards compatibility, primality checks live with the table size logic
+from logic.route_encryption import is_prime
+
 # This is used to keep paths relative to where the program is unpacked in the temp dir
 bundle_dir: str = getattr(
     sys,
@@ -19,22 +23,14 @@ def get_path_in_bundle_dir(path: str) -> str:
     return os.path.abspath(os.path.join(bundle_dir, path))
 
 
+@lru_cache(maxsize=None)
 def load_json(file_path: str) -> Union[Dict, Dict[str, List[str]]]:
     """
-    Loads json file at given path and returns it as dict
+    Loads json file at given path and returns it as dict. Files are only read
+    once, so the returned dict must not be modified.
     """
 
     file_path = get_path_in_bundle_dir(file_path)
-    print(file_path)
 
     with open(file_path) as _file:
         return json.load(_file)
-
-
-def is_prime(number: int) -> bool:
-
-    for num in range(2, number):
-        if number % num == 0:
-            return False
-
-    return True
@@ -0,0 +1,143 @@
+from typing import Any, Callable, Optional
+import traceback
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+# Errors a job fails with on bad input (InvalidCharacterError is a
+# ValueError). They are only sent to the error signal, anything else is a bug
+# and has its traceback printed as well.
+EXPECTED_ERRORS = (ValueError,)
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when it notices it has been cancelled
+    """
+
+
+class JobSignals(QObject):
+    """
+    Signals of a CipherJob. QRunnable is not a QObject, so it can't have signals
+    of its own. Every signal carries the id of the job it comes from.
+    """
+    progress = pyqtSignal(int, int)
+    result = pyqtSignal(int, object)
+    error = pyqtSignal(int, object)
+
+
+class CipherJob(QRunnable):
+    """
+    Runs given function on a worker thread of a QThreadPool.
+
+    The function is called with a report_progress(percent) callback as its
+    first argument, which it should call between its stages. Once the job is
+    cancelled the callback raises JobCancelled, so the job stops at its next
+    stage and emits nothing.
+
+    Cancellation is only checked when the function reports progress, so a
+    stage that is already running (a whole encryption, say) runs to its end
+    before the job stops. Its result is dropped either way.
+    """
+
+    def __init__(self, job_id: int, function: Callable[..., Any], *args) -> None:
+        super().__init__()
+
+        self.job_id = job_id
+        self.function = function
+        self.args = args
+
+        self.signals = JobSignals()
+
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def report_progress(self, percent: int) -> None:
+        if self._cancelled:
+            raise JobCancelled()
+
+        self.signals.progress.emit(self.job_id, percent)
+
+    def run(self) -> None:
+        try:
+            result = self.function(self.report_progress, *self.args)
+
+        except JobCancelled:
+            return
+
+        except Exception as e:
+            if not isinstance(e, EXPECTED_ERRORS):
+                traceback.print_exc()
+
+            if not self._cancelled:
+                self.signals.error.emit(self.job_id, e)
+
+            return
+
+        if not self._cancelled:
+            self.signals.result.emit(self.job_id, result)
+
+
+class JobRunner:
+    """
+    Sends cipher jobs of one window to the global thread pool.
+
+    Starting a job cancels the one before it, and only the signals of the
+    latest job reach the callbacks, so a slow job that finishes late can never
+    overwrite the output of a newer one.
+    """
+
+    def __init__(self, thread_pool: Optional[QThreadPool] = None) -> None:
+        self.thread_pool = thread_pool or QThreadPool.globalInstance()
+
+        self._latest_job_id = 0
+        self._current_job: Optional[CipherJob] = None
+
+    def submit(self, function: Callable[..., Any], *args, on_result: Callable[[Any], None],
+               on_error: Callable[[Exception], None], on_progress: Callable[[int], None] = None) -> None:
+        """
+        Cancels the running job (if any) and starts function(report_progress, *args)
+        on a worker thread
+        """
+        self.cancel()
+
+        self._latest_job_id += 1
+
+        job = CipherJob(self._latest_job_id, function, *args)
+
+        job.signals.result.connect(lambda job_id, result: self._on_finished(job_id, result, on_result))
+        job.signals.error.connect(lambda job_id, error: self._on_finished(job_id, error, on_error))
+
+        if on_progress is not None:
+            job.signals.progress.connect(lambda job_id, percent: self._on_progress(job_id, percent, on_progress))
+
+        self._current_job = job
+
+        self.thread_pool.start(job)
+
+    def cancel(self) -> None:
+        """
+        Cancels the running job. Nothing it emits from now on is applied.
+        """
+        if self._current_job is not None:
+            self._current_job.cancel()
+            self._current_job = None
+
+    def is_running(self) -> bool:
+        return self._current_job is not None
+
+    def _is_current(self, job_id: int) -> bool:
+        # Signals are delivered on the GUI thread, so nothing can start a new
+        # job between this check and the callback
+        return self._current_job is not None and job_id == self._latest_job_id
+
+    def _on_progress(self, job_id: int, percent: int, callback: Callable[[int], None]) -> None:
+        if self._is_current(job_id):
+            callback(percent)
+
+    def _on_finished(self, job_id: int, value: Any, callback: Callable[[Any], None]) -> None:
+        if self._is_current(job_id):
+            self._current_job = None
+            callback(value)